@@ -8,16 +8,41 @@
 # =============================
 
 import os
+from functools import lru_cache
+import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # headless: no GUI backend probing
 import matplotlib.pyplot as plt
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+load_dotenv()
+
+PLOT_DPI = 80
+
+# Rows per request; keep at or below PostgREST's max-rows (1000 on Supabase by default),
+# otherwise a capped page looks like the last one and the read stops early
+PAGE_SIZE = 1000
+
+FETCH_DTYPES = {
+    "seniorcitizen": "int8",
+    "contract_type_code": "Int8",
+    "has_internet_service": "int8",
+    "is_multi_line_user": "int8",
+    "contract": "category",
+    "internetservice": "category",
+    "paymentmethod": "category",
+    "tenure_group": "category",
+    "monthly_charge_segment": "category",
+    "churn": "category",
+}
+
 # ---------------------------------------------------------
 # Initialize Supabase Client
 # ---------------------------------------------------------
+@lru_cache(maxsize=1)
 def get_supabase_client() -> Client:
-    load_dotenv()
     url = os.getenv("SUPABASE_URL")
     key = os.getenv("SUPABASE_KEY")
 
@@ -27,33 +52,52 @@ def get_supabase_client() -> Client:
     return create_client(url, key)
 
 # ---------------------------------------------------------
-# Read entire table from Supabase
+# Read entire table from Supabase (paged)
 # ---------------------------------------------------------
 def fetch_data(table: str = "telco_customer_churn") -> pd.DataFrame:
     supabase = get_supabase_client()
 
     print("📥 Fetching data from Supabase...")
-    response = supabase.table(table).select("*").execute()
-
-    if hasattr(response, "error") and response.error:
-        raise RuntimeError(f"❌ Error fetching data: {response.error}")
+    rows = []
+    start = 0
+    while True:
+        response = (
+            supabase.table(table)
+            .select("*")
+            .order("id")
+            .range(start, start + PAGE_SIZE - 1)
+            .execute()
+        )
+
+        if hasattr(response, "error") and response.error:
+            raise RuntimeError(f"❌ Error fetching data: {response.error}")
+
+        rows.extend(response.data)
+        if len(response.data) < PAGE_SIZE:
+            break
+        start += PAGE_SIZE
+
+    # Build the DataFrame once from all pages
+    df = pd.DataFrame(rows)
+
+    # Shrink dtypes: 0/1/2 flags fit in int8, repeated labels become categories
+    df = df.astype({col: dtype for col, dtype in FETCH_DTYPES.items() if col in df.columns})
 
-    df = pd.DataFrame(response.data)
     print(f"✅ Retrieved {len(df)} rows.")
     return df
 
 # ---------------------------------------------------------
 # Perform Analysis
 # ---------------------------------------------------------
-def generate_analysis(df: pd.DataFrame):
+def generate_analysis(df: pd.DataFrame, churn_bool: pd.Series):
     analysis = {}
 
     # 1️⃣ Churn percentage
-    churn_rate = (df["churn"].str.lower() == "yes").mean() * 100
+    churn_rate = churn_bool.mean() * 100
     analysis["churn_percentage"] = round(churn_rate, 2)
 
     # 2️⃣ Average monthly charges per contract
-    avg_monthly_contract = df.groupby("contract")["monthlycharges"].mean()
+    avg_monthly_contract = df.groupby("contract", observed=True)["monthlycharges"].mean()
 
     # 3️⃣ Customer tenure groups count
     tenure_counts = df["tenure_group"].value_counts()
@@ -62,7 +106,9 @@ def generate_analysis(df: pd.DataFrame):
     internet_dist = df["internetservice"].value_counts()
 
     # 5️⃣ Pivot: Churn vs Tenure Group
-    churn_tenure_pivot = pd.crosstab(df["tenure_group"], df["churn"])
+    churn_tenure_pivot = (
+        df.groupby(["tenure_group", "churn"], observed=True).size().unstack(fill_value=0)
+    )
 
     # Build final summary dict → DataFrame
     summary = {
@@ -101,38 +147,40 @@ def save_summary_csv(summary_df):
 # ---------------------------------------------------------
 # Optional Visualizations
 # ---------------------------------------------------------
-def create_visualizations(df):
+def create_visualizations(df, churn_bool: pd.Series):
     viz_dir = os.path.join("..", "data", "processed", "plots")
     os.makedirs(viz_dir, exist_ok=True)
 
+    # One Figure/Axes reused for every chart
+    fig, ax = plt.subplots()
+
     # 🔸 Churn Rate by Monthly Charge Segment
-    churn_by_segment = df.groupby("monthly_charge_segment")["churn"].apply(
-        lambda x: (x.str.lower() == "yes").mean() * 100
-    )
+    churn_by_segment = churn_bool.groupby(df["monthly_charge_segment"], observed=True).mean() * 100
 
-    plt.figure()
-    churn_by_segment.plot(kind="bar")
-    plt.title("Churn Rate by Monthly Charge Segment")
-    plt.ylabel("Churn %")
-    plt.savefig(os.path.join(viz_dir, "churn_by_segment.png"))
-    plt.close()
+    churn_by_segment.plot(kind="bar", ax=ax)
+    ax.set_title("Churn Rate by Monthly Charge Segment")
+    ax.set_ylabel("Churn %")
+    fig.savefig(os.path.join(viz_dir, "churn_by_segment.png"), dpi=PLOT_DPI)
 
     # 🔸 Histogram of TotalCharges
-    plt.figure()
-    df["totalcharges"].hist(bins=30)
-    plt.title("Distribution of Total Charges")
-    plt.xlabel("Total Charges")
-    plt.ylabel("Frequency")
-    plt.savefig(os.path.join(viz_dir, "totalcharges_hist.png"))
-    plt.close()
+    ax.clear()
+    vals = df["totalcharges"].dropna().to_numpy(dtype=float)
+    counts, edges = np.histogram(vals, bins=30)
+    ax.bar(edges[:-1], counts, width=np.diff(edges), align="edge")
+    ax.grid(True)
+    ax.set_title("Distribution of Total Charges")
+    ax.set_xlabel("Total Charges")
+    ax.set_ylabel("Frequency")
+    fig.savefig(os.path.join(viz_dir, "totalcharges_hist.png"), dpi=PLOT_DPI)
 
     # 🔸 Bar plot of Contract Types
-    plt.figure()
-    df["contract"].value_counts().plot(kind="bar")
-    plt.title("Contract Type Distribution")
-    plt.ylabel("Count")
-    plt.savefig(os.path.join(viz_dir, "contract_distribution.png"))
-    plt.close()
+    ax.clear()
+    df["contract"].value_counts().plot(kind="bar", ax=ax)
+    ax.set_title("Contract Type Distribution")
+    ax.set_ylabel("Count")
+    fig.savefig(os.path.join(viz_dir, "contract_distribution.png"), dpi=PLOT_DPI)
+
+    plt.close(fig)
 
     print("📊 Visualizations saved in /data/processed/plots")
 
@@ -141,7 +189,9 @@ def create_visualizations(df):
 # ---------------------------------------------------------
 if __name__ == "__main__":
     df = fetch_data()
-    summary_df, avg_monthly_contract, internet_dist, pivot = generate_analysis(df)
+    # Lower-cased churn flag, computed once and shared by analysis + plots
+    churn_bool = df["churn"].str.lower().eq("yes")
+    summary_df, avg_monthly_contract, internet_dist, pivot = generate_analysis(df, churn_bool)
 
     print("\n======= SUMMARY REPORT =======")
     print(summary_df)
@@ -153,6 +203,6 @@ if __name__ == "__main__":
     print(pivot)
 
     save_summary_csv(summary_df)
-    create_visualizations(df)
+    create_visualizations(df, churn_bool)
 
     print("\n🎉 Analysis Completed Successfully!")
@@ -1,5 +1,8 @@
 # extract.py
 import os
+import shutil
+from email.utils import formatdate
+from pathlib import Path
 import requests
 
 def extract_data():
@@ -12,12 +15,39 @@ def extract_data():
     dl_url = f"https://drive.google.com/uc?export=download&id={file_id}"
     raw_path = os.path.join(data_dir, "WA_Fn-UseC_-Telco-Customer-Churn.csv")
 
+    # Conditional request: skip the download if the cached copy is still current
+    etag_path = raw_path + ".etag"
+    headers = {}
+    if os.path.exists(raw_path):
+        headers["If-Modified-Since"] = formatdate(os.path.getmtime(raw_path), usegmt=True)
+        if os.path.exists(etag_path):
+            with open(etag_path) as f:
+                headers["If-None-Match"] = f.read().strip()
+
     try:
         print(f"🔍 Attempting to download dataset from Google Drive to: {raw_path}")
-        resp = requests.get(dl_url, timeout=30)
-        resp.raise_for_status()
-        with open(raw_path, "wb") as f:
-            f.write(resp.content)
+        with requests.get(dl_url, headers=headers, timeout=30, stream=True) as resp:
+            if resp.status_code == 304:
+                print(f"ℹ️  Dataset unchanged since last download, using: {raw_path}")
+                return raw_path
+            resp.raise_for_status()
+
+            # Stream to a temp file in 1 MiB chunks, then swap it in so a failed
+            # download never leaves a truncated CSV behind
+            resp.raw.decode_content = True
+            tmp_path = raw_path + ".part"
+            try:
+                with open(tmp_path, "wb") as f:
+                    shutil.copyfileobj(resp.raw, f, length=1 << 20)
+                os.replace(tmp_path, raw_path)
+            except BaseException:
+                Path(tmp_path).unlink(missing_ok=True)  # don't leave a half-written .part behind
+                raise
+
+            etag = resp.headers.get("ETag")
+            if etag:
+                with open(etag_path, "w") as f:
+                    f.write(etag)
         print(f"✅ Data extracted and saved at: {raw_path}")
     except Exception as e:
         # If download fails, check if file exists locally already
@@ -1,22 +1,40 @@
 # load.py
 # Purpose: Load transformed Telco dataset into Supabase using Supabase client
+# (or Postgres COPY over DATABASE_URL when it is set in .env)
 
+import io
 import os
-import math
+from contextlib import closing
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
-BATCH_SIZE = 200  # adjust as needed
+load_dotenv()
 
+BATCH_SIZE = 5000  # halved automatically if PostgREST rejects a batch as too large
+MAX_WORKERS = 8  # concurrent insert requests
+
+@lru_cache(maxsize=1)
 def get_supabase_client() -> Client:
-    load_dotenv()
     url = os.getenv("SUPABASE_URL")
     key = os.getenv("SUPABASE_KEY")
     if not url or not key:
         raise ValueError("❌ Missing SUPABASE_URL or SUPABASE_KEY in .env")
     return create_client(url, key)
 
+def get_database_url():
+    """Direct Postgres connection string (Supabase: Settings → Database), if configured."""
+    return os.getenv("DATABASE_URL")
+
+def get_pg_connection():
+    # psycopg2 is only required for the direct COPY path
+    import psycopg2
+    return psycopg2.connect(get_database_url())
+
 def create_table_if_not_exists():
     create_table_sql = """
     CREATE TABLE IF NOT EXISTS public.telco_customer_churn (
@@ -48,6 +66,17 @@ def create_table_if_not_exists():
         contract_type_code INTEGER
     );
     """
+    if get_database_url():
+        try:
+            with closing(get_pg_connection()) as conn:
+                with conn, conn.cursor() as cur:
+                    cur.execute(create_table_sql)
+            print("✅ Table 'telco_customer_churn' created or already exists (via DATABASE_URL).")
+            return
+        except Exception as e:
+            print(f"⚠️  Could not create table via DATABASE_URL: {e}")
+            print("ℹ️  Falling back to Supabase RPC...")
+
     try:
         supabase = get_supabase_client()
         try:
@@ -60,6 +89,51 @@ def create_table_if_not_exists():
         print(f"⚠️  Error checking/creating table: {e}")
         print("ℹ️  Trying to continue with data insertion...")
 
+def _is_batch_too_large(err) -> bool:
+    msg = str(err).lower()
+    return any(s in msg for s in ("413", "too large", "timeout", "timed out"))
+
+def _insert_batch(supabase: Client, table_name: str, records: list):
+    """Insert records in one request; on 413/timeout split the batch in half and retry.
+
+    Returns the first error encountered, or None on success.
+    """
+    try:
+        response = supabase.table(table_name).insert(records).execute()
+        err = None
+        if hasattr(response, "error") and response.error:
+            err = response.error
+        elif isinstance(response, dict) and response.get("error"):
+            err = response.get("error")
+    except Exception as e:
+        err = e
+
+    if err and len(records) > 1 and _is_batch_too_large(err):
+        mid = len(records) // 2
+        print(f"ℹ️  Batch of {len(records)} rows rejected ({err}); retrying as two batches of ~{mid}")
+        return _insert_batch(supabase, table_name, records[:mid]) or _insert_batch(supabase, table_name, records[mid:])
+    return err
+
+def copy_to_postgres(staged_path: str, table_name: str = "telco_customer_churn") -> int:
+    """
+    Bulk-load the staged Parquet with COPY ... FROM STDIN over a direct Postgres connection.
+    Rows are streamed as CSV (no JSON, no PostgREST) in a single transaction.
+    Returns the number of rows copied.
+    """
+    # Arrow end to end: read the Parquet and encode CSV with the multithreaded C++ writer
+    table = pq.read_table(staged_path)
+    buf = io.BytesIO()
+    pacsv.write_csv(table, buf, write_options=pacsv.WriteOptions(include_header=False))
+    buf.seek(0)
+
+    # Unquoted identifiers are lowercase in Postgres
+    columns = [c.lower() for c in table.column_names]
+    copy_sql = f"COPY public.{table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    with closing(get_pg_connection()) as conn:
+        with conn, conn.cursor() as cur:
+            cur.copy_expert(copy_sql, buf)
+            return cur.rowcount
+
 def load_to_supabase(staged_path: str, table_name: str = "telco_customer_churn"):
     if not os.path.isabs(staged_path):
         staged_path = os.path.abspath(os.path.join(os.path.dirname(__file__), staged_path))
@@ -70,6 +144,17 @@ def load_to_supabase(staged_path: str, table_name: str = "telco_customer_churn")
         print("ℹ️  Please run transform.py first to generate the transformed data")
         return
 
+    if get_database_url():
+        try:
+            copied = copy_to_postgres(staged_path, table_name)
+            print(f"✅ Copied {copied} rows into '{table_name}' via COPY.")
+            print(f"🎯 Finished loading data into '{table_name}'.")
+            return
+        except Exception as e:
+            # COPY is transactional, so nothing was written; retry through PostgREST
+            print(f"⚠️  COPY via DATABASE_URL failed: {e}")
+            print("ℹ️  Falling back to Supabase REST inserts...")
+
     try:
         supabase = get_supabase_client()
     except Exception as e:
@@ -77,92 +162,45 @@ def load_to_supabase(staged_path: str, table_name: str = "telco_customer_churn")
         return
 
     try:
-        df = pd.read_csv(staged_path)
+        df = pd.read_parquet(staged_path)
     except Exception as e:
-        print(f"❌ Error reading CSV: {e}")
+        print(f"❌ Error reading Parquet: {e}")
         return
 
     total_rows = len(df)
     print(f"📊 Loading {total_rows} rows into '{table_name}'...")
 
-    for i in range(0, total_rows, BATCH_SIZE):
-        batch = df.iloc[i:i + BATCH_SIZE].copy()
-
-        # Convert NaN -> None (JSON-safe)
-        batch = batch.where(pd.notnull(batch), None)
-
-        # Cast integer-like float columns if they exist in batch
-        for col in ["tenure", "SeniorCitizen", "contract_type_code", "is_multi_line_user", "has_internet_service"]:
-            if col in batch.columns:
-                try:
-                    if batch[col].dtype == "float64":
-                        if batch[col].dropna().apply(lambda x: float(x).is_integer()).all():
-                            batch[col] = batch[col].astype("Int64")
-                except Exception:
-                    pass
-
-        records = batch.to_dict("records")
-
-        # Replace lingering float('nan') with None (defensive)
-        for rec in records:
-            for k, v in list(rec.items()):
-                if isinstance(v, float) and math.isnan(v):
-                    rec[k] = None
-
-        # Ensure numpy scalar -> python builtins for simple types
-        def normalize_value(v):
-            import numpy as _np
-            if v is None:
-                return None
-            if isinstance(v, _np.integer):
-                return int(v)
-            if isinstance(v, _np.floating):
-                if float(v).is_integer():
-                    return int(v)
-                return float(v)
-            if isinstance(v, _np.bool_):
-                return bool(v)
-            return v
-
-        for rec in records:
-            for k in list(rec.keys()):
-                rec[k] = normalize_value(rec[k])
+    # Dtypes survive the Parquet round trip, so an object cast is enough for
+    # to_dict() to emit Python builtins. Convert NaN/<NA> -> None (JSON-safe)
+    df = df.astype(object).where(df.notnull(), None)
 
-        try:
-            
-            # Convert dict keys to lowercase so they match Postgres column names (unquoted -> lowercase)
-            normalized_records = []
-            for rec in records:
-                lower_rec = {k.lower(): v for k, v in rec.items()}
-                normalized_records.append(lower_rec)
-
-# use normalized_records for insertion
-            response = supabase.table(table_name).insert(normalized_records).execute()
-
-            err = None
-            if hasattr(response, "error") and response.error:
-                err = response.error
-            elif isinstance(response, dict) and response.get("error"):
-                err = response.get("error")
+    # Convert dict keys to lowercase so they match Postgres column names (unquoted -> lowercase)
+    df.columns = [c.lower() for c in df.columns]
+    all_records = df.to_dict("records")
+
+    batches = [(i, all_records[i:i + BATCH_SIZE]) for i in range(0, total_rows, BATCH_SIZE)]
 
+    # Batches are disjoint, so send them concurrently to overlap network round-trips
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = {
+            ex.submit(_insert_batch, supabase, table_name, batch_records): (i, batch_records)
+            for i, batch_records in batches
+        }
+        for future in as_completed(futures):
+            i, batch_records = futures[future]
+            batch_no = (i // BATCH_SIZE) + 1
+            err = future.result()
             if err:
-                batch_no = (i // BATCH_SIZE) + 1
                 print(f"⚠️  Error in batch {batch_no}: {err}")
-                if records:
-                    print("Sample record:", records[0])
+                if batch_records:
+                    print("Sample record:", batch_records[0])
             else:
                 end = min(i + BATCH_SIZE, total_rows)
                 print(f"✅ Inserted rows {i+1}-{end} of {total_rows}")
-        except Exception as e:
-            batch_no = (i // BATCH_SIZE) + 1
-            print(f"⚠️  Exception inserting batch {batch_no}: {e}")
-            if records:
-                print("Sample record:", records[0])
-            continue
 
     print(f"🎯 Finished loading data into '{table_name}'.")
 
 if __name__ == "__main__":
-    staged_csv_path = os.path.join("..", "data", "staged", "telco_transformed.csv")
+    staged_path = os.path.join("..", "data", "staged", "telco_transformed.parquet")
     create_table_if_not_exists()
-    load_to_supabase(staged_csv_path)
+    load_to_supabase(staged_path)
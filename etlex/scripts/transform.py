@@ -8,81 +8,72 @@ def transform_data(raw_path):
     staged_dir = os.path.join(base_dir, "data", "staged")
     os.makedirs(staged_dir, exist_ok=True)
 
-    df = pd.read_csv(raw_path)
+    # customerID and gender are dropped from the output, so skip parsing them
+    header = pd.read_csv(raw_path, nrows=0).columns
+    df = pd.read_csv(
+        raw_path,
+        engine="pyarrow",  # multithreaded C++ parser
+        usecols=[c for c in header if c not in {"customerID", "gender"}],
+        dtype={"SeniorCitizen": "int8"},
+    )
 
     # --- Cleaning Tasks ---
     # Convert TotalCharges to numeric (spaces become NaN)
     df["TotalCharges"] = pd.to_numeric(df["TotalCharges"], errors="coerce")
 
     # Fill missing numeric values using median for tenure, MonthlyCharges, TotalCharges
-    for col in ["tenure", "MonthlyCharges", "TotalCharges"]:
-        if col in df.columns:
-            median_val = df[col].median()
-            df[col] = df[col].fillna(median_val)
+    num_cols = [c for c in ["tenure", "MonthlyCharges", "TotalCharges"] if c in df.columns]
+    df[num_cols] = df[num_cols].fillna(df[num_cols].median())
 
     # Replace missing categorical values with "Unknown"
-    # Consider object (string) columns and categorical-like columns
-    for col in df.select_dtypes(include=["object"]).columns:
-        df[col] = df[col].fillna("Unknown")
-    # If some categorical columns are not object dtype, handle them too
-    for col in ["InternetService", "MultipleLines", "Contract"]:
-        if col in df.columns and df[col].isnull().any():
-            df[col] = df[col].fillna("Unknown")
+    # Object (string) columns plus the categorical-like columns, even if not object dtype
+    cat_cols = df.select_dtypes(include=["object"]).columns.union(
+        [c for c in ["InternetService", "MultipleLines", "Contract"] if c in df.columns],
+        sort=False,
+    )
+    df[cat_cols] = df[cat_cols].fillna("Unknown")
 
     # --- Feature Engineering ---
     # 1. tenure_group
-    def tenure_group_fn(t):
-        if t <= 12:
-            return "New"
-        elif 13 <= t <= 36:
-            return "Regular"
-        elif 37 <= t <= 60:
-            return "Loyal"
-        else:
-            return "Champion"
-
-    df["tenure_group"] = df["tenure"].apply(tenure_group_fn)
+    # (<=12] New, (12, 36] Regular, (36, 60] Loyal, > 60 Champion
+    df["tenure_group"] = pd.cut(
+        df["tenure"],
+        bins=[-np.inf, 12, 36, 60, np.inf],
+        labels=["New", "Regular", "Loyal", "Champion"],
+    )
 
     # 2. monthly_charge_segment
-    def monthly_segment(m):
-        if m < 30:
-            return "Low"
-        elif 30 <= m <= 70:
-            return "Medium"
-        else:
-            return "High"
-
-    df["monthly_charge_segment"] = df["MonthlyCharges"].apply(monthly_segment)
+    # < 30 Low ; 30-70 (inclusive) Medium ; > 70 High
+    df["monthly_charge_segment"] = pd.Categorical(
+        np.select(
+            [df["MonthlyCharges"] < 30, df["MonthlyCharges"] <= 70],
+            ["Low", "Medium"],
+            default="High",
+        ),
+        categories=["Low", "Medium", "High"],
+        ordered=True,
+    )
 
     # 3. has_internet_service
     # "DSL" / "Fiber optic" -> 1 ; "No" -> 0 ; unknown/others -> 0
-    df["has_internet_service"] = df["InternetService"].apply(
-        lambda x: 1 if str(x).strip().lower() in {"dsl", "fiber optic", "fiber"} else 0
-    )
+    internet = df["InternetService"].astype("string").str.strip().str.lower()
+    df["has_internet_service"] = internet.isin(["dsl", "fiber optic", "fiber"]).astype("int8")
 
     # 4. is_multi_line_user
-    df["is_multi_line_user"] = df["MultipleLines"].apply(lambda x: 1 if str(x).strip().lower() == "yes" else 0)
+    multi_line = df["MultipleLines"].astype("string").str.strip().str.lower()
+    df["is_multi_line_user"] = multi_line.eq("yes").fillna(False).astype("int8")
 
     # 5. contract_type_code
-    mapping = {
-        "Month-to-month": 0,
-        "One year": 1,
-        "Two year": 2,
-        # Add unknown/default mapping:
-        "Unknown": None
-    }
-    # Normalize strings and map
-    df["Contract"] = df["Contract"].astype(str)
-    df["contract_type_code"] = df["Contract"].apply(lambda x: mapping.get(x, None))
-
-    # --- Drop unnecessary fields ---
-    # Remove: customerID, gender
-    df.drop(columns=["customerID", "gender"], inplace=True, errors="ignore")
+    # Unmapped values (e.g. "Unknown") become <NA>
+    df["contract_type_code"] = df["Contract"].map(
+        {"Month-to-month": 0, "One year": 1, "Two year": 2}
+    ).astype("Int8")
 
     # --- Save transformed data ---
-    staged_path = os.path.join(staged_dir, "telco_transformed.csv")
-    # Ensure no numpy NaN remain as raw NaN (we'll keep them; loader will convert NaN->None)
-    df.to_csv(staged_path, index=False)
+    # Parquet keeps the int8/Int8/category dtypes for load.py and validate.py
+    staged_path = os.path.join(staged_dir, "telco_transformed.parquet")
+    # Missing values stay as nulls; loader converts them to None
+    df.to_parquet(staged_path, index=False, compression="zstd")
     print(f"✅ Data transformed and saved at: {staged_path}")
     return staged_path
 
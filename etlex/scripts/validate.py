@@ -2,7 +2,7 @@
 # validate.py  (Telco dataset)
 # ===========================
 # Purpose:
-# - Validate transformed Telco data (CSV + Supabase)
+# - Validate transformed Telco data (staged Parquet + Supabase)
 # - Checks:
 #   ✔ No missing values in tenure, MonthlyCharges, TotalCharges
 #   ✔ Unique row count == original dataset row count
@@ -12,14 +12,17 @@
 #   ✔ Print validation summary
 
 import os
+from functools import lru_cache
 import pandas as pd
 from supabase import create_client
 from dotenv import load_dotenv
 
+load_dotenv()
+
 
 # ---------- Supabase client helper ----------
+@lru_cache(maxsize=1)
 def get_supabase_client():
-    load_dotenv()
     url = os.getenv("SUPABASE_URL")
     key = os.getenv("SUPABASE_KEY")
 
@@ -34,7 +37,7 @@ def validate_telco():
 
     # Paths
     raw_path = os.path.join(base_dir, "data", "raw", "WA_Fn-UseC_-Telco-Customer-Churn.csv")
-    staged_path = os.path.join(base_dir, "data", "staged", "telco_transformed.csv")
+    staged_path = os.path.join(base_dir, "data", "staged", "telco_transformed.parquet")
 
     print("🔍 Starting Telco dataset validation...\n")
 
@@ -48,10 +51,13 @@ def validate_telco():
         print("ℹ️ Please run transform_telco.py first.")
         return
 
-    raw_df = pd.read_csv(raw_path)
-    df = pd.read_csv(staged_path)
+    # Only the raw row count is needed, so count lines instead of parsing (minus header)
+    with open(raw_path, "rb") as f:
+        raw_rows = sum(1 for _ in f) - 1
+    # Keep every column: the duplicate check below compares whole rows
+    df = pd.read_parquet(staged_path)
 
-    print(f"📁 Raw dataset rows:        {len(raw_df)}")
+    print(f"📁 Raw dataset rows:        {raw_rows}")
     print(f"📁 Transformed dataset rows:{len(df)}\n")
 
     # ---------- 2️⃣ No missing values in key numeric columns ----------
@@ -75,8 +81,7 @@ def validate_telco():
     print()
 
     # ---------- 3️⃣ Unique row count vs original ----------
-    unique_rows = len(df.drop_duplicates())
-    raw_rows = len(raw_df)
+    unique_rows = len(df) - int(df.duplicated().sum())
 
     print(f"📊 Unique rows in transformed data: {unique_rows}")
     print(f"📊 Rows in original raw data:       {raw_rows}")
@@ -91,16 +96,16 @@ def validate_telco():
     try:
         supabase = get_supabase_client()
 
-        # Use exact count from Supabase
-        response = supabase.table("telco_customer_churn").select("*", count="exact").execute()
-        supabase_rows = response.count if hasattr(response, "count") else len(response.data)
+        # Exact count from the Content-Range header only (head=True → no row payload)
+        response = supabase.table("telco_customer_churn").select("*", count="exact", head=True).execute()
+        supabase_rows = response.count
 
         print(f"🗄️ Rows in Supabase table 'telco_customer_churn': {supabase_rows}")
 
         if supabase_rows == len(df):
-            print("✅ Supabase row count matches transformed CSV")
+            print("✅ Supabase row count matches transformed dataset")
         else:
-            print("⚠️ Supabase row count does NOT match transformed CSV")
+            print("⚠️ Supabase row count does NOT match transformed dataset")
 
     except Exception as e:
         print(f"❌ Error fetching Supabase row count: {e}")
@@ -20,11 +20,20 @@ Style:
 """
 
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Tuple
+from typing import Tuple, Union
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import matplotlib
+matplotlib.use("Agg")  # headless: no interactive backend setup
 import matplotlib.pyplot as plt
+from PIL import Image
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
@@ -45,9 +54,44 @@ SUMMARY_CSV = PROCESSED_DIR / "summary_metrics.csv"
 RISK_DIST_CSV = PROCESSED_DIR / "city_risk_distribution.csv"
 TRENDS_CSV = PROCESSED_DIR / "pollution_trends.csv"
 
+# Supabase (PostgREST) caps each response at 1000 rows by default
+PAGE_SIZE = int(os.getenv("AQ_PAGE_SIZE", "1000"))
+FETCH_WORKERS = 8
+
+# Arrow schema for fetched rows; time stays a string here and is parsed in prepare_df
+FETCH_SCHEMA = pa.schema([
+    ("city", pa.string()),
+    ("time", pa.string()),
+    ("pm10", pa.float32()),
+    ("pm2_5", pa.float32()),
+    ("carbon_monoxide", pa.float32()),
+    ("nitrogen_dioxide", pa.float32()),
+    ("sulphur_dioxide", pa.float32()),
+    ("ozone", pa.float32()),
+    ("uv_index", pa.float32()),
+    ("aqi_category", pa.string()),
+    ("severity_score", pa.float32()),
+    ("risk_flag", pa.string()),
+    ("hour", pa.int8()),
+])
+
+NUMERIC_COLS = ["pm10", "pm2_5", "ozone", "sulphur_dioxide", "nitrogen_dioxide", "carbon_monoxide", "uv_index", "severity_score"]
+
+# Fixed risk categories so groupbys run on int codes with a stable order
+RISK_DTYPE = pd.CategoricalDtype(["High Risk", "Moderate Risk", "Low Risk", "Unknown"])
+
+# Above this many points the scatter plot is drawn as a binned density image instead
+DENSITY_THRESHOLD = 20_000
+DENSITY_BINS = 200
+
+# One figure is reused for every plot
+FIGSIZE = (10, 6)
+PLOT_DPI = 100
+
 # -----------------------------
 # Supabase client
 # -----------------------------
+@lru_cache(maxsize=1)
 def get_supabase_client() -> Client:
     if not SUPABASE_URL or not SUPABASE_KEY:
         raise ValueError("❌ SUPABASE_URL or SUPABASE_KEY missing in environment (.env)")
@@ -56,11 +100,7 @@ def get_supabase_client() -> Client:
 # -----------------------------
 # Fetch data from Supabase
 # -----------------------------
-def fetch_data(table: str = TABLE_NAME) -> pd.DataFrame:
-    supabase = get_supabase_client()
-    print(f"📥 Fetching data from Supabase table '{table}' ...")
-    res = supabase.table(table).select("*").execute()
-
+def _response_data(res):
     # supabase-py may return object with .data / .error or a dict; handle both.
     if hasattr(res, "error") and res.error:
         raise RuntimeError(f"❌ Error fetching data: {res.error}")
@@ -75,14 +115,66 @@ def fetch_data(table: str = TABLE_NAME) -> pd.DataFrame:
             data = res[0]
     if data is None:
         raise RuntimeError("❌ Unexpected response from Supabase client when fetching data.")
+    return data
+
+def _fetch_page(supabase: Client, table: str, offset: int) -> pa.RecordBatch:
+    res = (supabase.table(table).select("*")
+           .order("id")
+           .range(offset, offset + PAGE_SIZE - 1)
+           .execute())
+    return pa.RecordBatch.from_pylist(_response_data(res), schema=FETCH_SCHEMA)
 
-    df = pd.DataFrame(data)
+def fetch_data(table: str = TABLE_NAME) -> pd.DataFrame:
+    supabase = get_supabase_client()
+    print(f"📥 Fetching data from Supabase table '{table}' ...")
+
+    # Row count only (no body), then pull pages concurrently
+    head = supabase.table(table).select("*", count="exact", head=True).execute()
+    total = getattr(head, "count", None)
+
+    if total is None:
+        # No count returned (e.g. no Content-Range): page sequentially until a short page
+        print("⚠️ Row count unavailable; fetching pages sequentially.")
+        batches = []
+        offset = 0
+        while True:
+            batches.append(_fetch_page(supabase, table, offset))
+            if batches[-1].num_rows < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+    else:
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+            batches = list(pool.map(lambda off: _fetch_page(supabase, table, off),
+                                    range(0, total, PAGE_SIZE)))
+
+    tbl = pa.Table.from_batches(batches, schema=FETCH_SCHEMA)
+    df = tbl.to_pandas(types_mapper={pa.int8(): pd.Int8Dtype()}.get)
     print(f"✅ Retrieved {len(df)} rows.")
     return df
 
 # -----------------------------
 # Cleaning + helpers
 # -----------------------------
+def _norm_risk_label(value) -> str:
+    return "Unknown" if pd.isna(value) else str(value).strip().title()
+
+def _normalize_risk(risk: pd.Series) -> pd.Categorical:
+    """Normalize the few distinct risk labels once, then map every row through a code lookup."""
+    codes, uniques = pd.factorize(risk)  # missing -> -1
+    unknown = RISK_DTYPE.categories.get_loc("Unknown")
+    lut = RISK_DTYPE.categories.get_indexer([_norm_risk_label(u) for u in uniques])
+    lut = np.append(np.where(lut >= 0, lut, unknown), unknown)  # last slot serves code -1
+    return pd.Categorical.from_codes(lut[codes], dtype=RISK_DTYPE)
+
+def _arrow_column(values: pd.Series, name: str) -> pa.Array:
+    """Series -> Arrow array; mixed str/number object columns (e.g. ['12.5', 7]) are coerced instead of raising."""
+    try:
+        return pa.array(values, from_pandas=True)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        if name in NUMERIC_COLS or name == "hour":
+            return pa.array(pd.to_numeric(values, errors="coerce"), type=pa.float64())
+        return pa.array(values.astype("string"), type=pa.string())
+
 def prepare_df(df: pd.DataFrame) -> pd.DataFrame:
     """Normalize column names, convert time to datetime, ensure numeric columns exist."""
     if df.empty:
@@ -104,26 +196,56 @@ def prepare_df(df: pd.DataFrame) -> pd.DataFrame:
         if col not in df.columns:
             df[col] = None
 
-    # Parse time
-    df["time"] = pd.to_datetime(df["time"], errors="coerce")
+    # One Arrow pass for parsing/casts instead of a pd.to_numeric call per column
+    # (built column by column: no pandas metadata, and mixed-type columns get coerced)
+    tbl = pa.table({col: _arrow_column(df[col], col) for col in df.columns})
+
+    def _set(name, arr):
+        return tbl.set_column(tbl.schema.get_field_index(name), name, arr)
+
+    # Parse time as ISO8601: fractional seconds, Z/+00:00 offsets, "T" or " " separator.
+    # Unparseable -> null (like errors="coerce"), but say how many rows that drops from time KPIs.
+    if not pa.types.is_timestamp(tbl["time"].type):
+        parsed = pd.to_datetime(df["time"], format="ISO8601", utc=True, errors="coerce")
+        unparsed = int(parsed.isna().sum() - df["time"].isna().sum())
+        if unparsed:
+            print(f"⚠️ {unparsed} time values could not be parsed; those rows are left out of time-based metrics.")
+        # naive UTC, whole seconds (the analysis is hourly; keeps exported timestamps fraction-free)
+        tbl = _set("time", pa.array(parsed.dt.tz_localize(None).dt.floor("s"), type=pa.timestamp("s")))
 
-    # numeric conversions
-    numeric_cols = ["pm10", "pm2_5", "ozone", "sulphur_dioxide", "nitrogen_dioxide", "carbon_monoxide", "uv_index", "severity_score"]
-    for col in numeric_cols:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
+    # numeric conversions (float32); text columns fall back to pandas coercion
+    for col in NUMERIC_COLS:
+        try:
+            tbl = _set(col, pc.cast(tbl[col], pa.float32(), safe=False))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            tbl = _set(col, pa.array(pd.to_numeric(df[col], errors="coerce"), type=pa.float32()))
 
-    # hour fallback: if hour missing, extract from time
-    if df["hour"].isnull().all():
-        df["hour"] = df["time"].dt.hour
+    # hour fallback: fill each missing hour from time (int8)
+    tbl = _set("hour", pc.coalesce(pc.cast(tbl["hour"], pa.int8(), safe=False),
+                                   pc.cast(pc.hour(tbl["time"]), pa.int8())))
 
-    # Ensure city is string
-    df["city"] = df["city"].astype("string")
+    df = tbl.to_pandas(types_mapper={pa.int8(): pd.Int8Dtype()}.get)
+
+    # Categorical keys for every groupby downstream
+    df["city"] = df["city"].astype("string").astype("category")
+    df["risk_flag_norm"] = _normalize_risk(df["risk_flag"])
+
+    # Sort once by (city, time); downstream groupbys/trends rely on this order
+    df = df.sort_values(["city", "time"], kind="stable").reset_index(drop=True)
 
     return df
 
 # -----------------------------
 # A. KPI Metrics
 # -----------------------------
+def _group_means(codes: np.ndarray, n_groups: int, values: np.ndarray) -> np.ndarray:
+    """Per-group mean via bincount (NaN values skipped); NaN for groups with no data."""
+    ok = (codes >= 0) & ~np.isnan(values)
+    sums = np.bincount(codes[ok], weights=values[ok], minlength=n_groups)
+    counts = np.bincount(codes[ok], minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts
+
 def compute_kpis(df: pd.DataFrame) -> pd.DataFrame:
     """Return a small DataFrame with key metrics (one row per metric)."""
     metrics = []
@@ -132,41 +254,48 @@ def compute_kpis(df: pd.DataFrame) -> pd.DataFrame:
         metrics.append({"metric": "note", "value": "No data available"})
         return pd.DataFrame(metrics)
 
+    # Factorize keys once; every KPI below is a bincount over these codes
+    # (sorted so ties resolve like groupby().idxmax())
+    city_codes, cities = pd.factorize(df["city"], sort=True)
+    hour_codes, hours = pd.factorize(df["hour"], sort=True)
+    pm25 = df["pm2_5"].to_numpy(dtype="float64", na_value=np.nan)
+    sev = df["severity_score"].to_numpy(dtype="float64", na_value=np.nan)
+
     # 1) City with highest average PM2.5
-    pm25_by_city = df.groupby("city")["pm2_5"].mean().dropna()
-    if not pm25_by_city.empty:
-        city_max_pm25 = pm25_by_city.idxmax()
-        metrics.append({"metric": "city_highest_avg_pm2_5", "value": city_max_pm25})
-        metrics.append({"metric": "highest_avg_pm2_5_value", "value": round(pm25_by_city.max(), 3)})
+    pm25_by_city = _group_means(city_codes, len(cities), pm25)
+    if not np.isnan(pm25_by_city).all():
+        i = int(np.nanargmax(pm25_by_city))
+        metrics.append({"metric": "city_highest_avg_pm2_5", "value": cities[i]})
+        metrics.append({"metric": "highest_avg_pm2_5_value", "value": round(float(pm25_by_city[i]), 3)})
     else:
         metrics.append({"metric": "city_highest_avg_pm2_5", "value": None})
 
     # 2) City with highest average severity_score
-    sev_by_city = df.groupby("city")["severity_score"].mean().dropna()
-    if not sev_by_city.empty:
-        city_max_sev = sev_by_city.idxmax()
-        metrics.append({"metric": "city_highest_avg_severity", "value": city_max_sev})
-        metrics.append({"metric": "highest_avg_severity_value", "value": round(sev_by_city.max(), 3)})
+    sev_by_city = _group_means(city_codes, len(cities), sev)
+    if not np.isnan(sev_by_city).all():
+        i = int(np.nanargmax(sev_by_city))
+        metrics.append({"metric": "city_highest_avg_severity", "value": cities[i]})
+        metrics.append({"metric": "highest_avg_severity_value", "value": round(float(sev_by_city[i]), 3)})
     else:
         metrics.append({"metric": "city_highest_avg_severity", "value": None})
 
     # 3) Percentage of High/Moderate/Low risk hours (global)
-    # Normalize risk_flag text
-    df["risk_flag_norm"] = df["risk_flag"].astype("string").str.strip().str.title().fillna("Unknown")
-    risk_counts = df["risk_flag_norm"].value_counts(dropna=False)
-    total = risk_counts.sum() if not risk_counts.empty else 0
-    for label in ["High Risk", "Moderate Risk", "Low Risk", "Unknown"]:
+    # histogram straight over the fixed categorical codes (index == RISK_DTYPE order)
+    risk_codes = df["risk_flag_norm"].cat.codes.to_numpy()
+    risk_counts = np.bincount(risk_codes[risk_codes >= 0], minlength=len(RISK_DTYPE.categories))
+    total = risk_counts.sum()
+    for label, count in zip(RISK_DTYPE.categories, risk_counts):
         pct = None
         if total > 0:
-            pct = round((risk_counts.get(label, 0) / total) * 100, 2)
+            pct = round((count / total) * 100, 2)
         metrics.append({"metric": f"pct_{label.replace(' ', '_').lower()}", "value": pct})
 
     # 4) Hour of day with worst AQI (use avg pm2_5 as proxy)
-    hourly_pm25 = df.groupby("hour")["pm2_5"].mean().dropna()
-    if not hourly_pm25.empty:
-        worst_hour = int(hourly_pm25.idxmax())
-        metrics.append({"metric": "hour_worst_avg_pm2_5", "value": worst_hour})
-        metrics.append({"metric": "worst_hour_avg_pm2_5_value", "value": round(hourly_pm25.max(), 3)})
+    hourly_pm25 = _group_means(hour_codes, len(hours), pm25)
+    if not np.isnan(hourly_pm25).all():
+        i = int(np.nanargmax(hourly_pm25))
+        metrics.append({"metric": "hour_worst_avg_pm2_5", "value": int(hours[i])})
+        metrics.append({"metric": "worst_hour_avg_pm2_5_value", "value": round(float(hourly_pm25[i]), 3)})
     else:
         metrics.append({"metric": "hour_worst_avg_pm2_5", "value": None})
 
@@ -184,10 +313,8 @@ def build_pollution_trends(df: pd.DataFrame) -> pd.DataFrame:
         return pd.DataFrame(columns=["city", "time", "pm2_5", "pm10", "ozone"])
 
     trends = df[["city", "time", "pm2_5", "pm10", "ozone"]].copy()
-    # drop rows with no timestamp
-    trends = trends.dropna(subset=["time"])
-    # sort for nice plotting
-    trends = trends.sort_values(["city", "time"]).reset_index(drop=True)
+    # drop rows with no timestamp (already in city/time order from prepare_df)
+    trends = trends.dropna(subset=["time"]).reset_index(drop=True)
     return trends
 
 # -----------------------------
@@ -200,95 +327,129 @@ def build_risk_distribution(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         return pd.DataFrame()
 
-    dist = (df.assign(risk=df["risk_flag"].astype("string").str.strip().str.title().fillna("Unknown"))
-              .groupby(["city", "risk"])
-              .size()
-              .reset_index(name="count"))
-    total_by_city = dist.groupby("city")["count"].transform("sum")
-    dist["pct"] = (dist["count"] / total_by_city * 100).round(2)
+    counts = pd.crosstab(df["city"], df["risk_flag_norm"])
+    pct = counts.div(counts.sum(axis=1), axis=0).mul(100).round(2)
+    dist = counts.stack().rename("count").reset_index().rename(columns={"risk_flag_norm": "risk"})
+    dist["pct"] = pct.stack().values
+    # crosstab keeps unobserved categories; long form only lists risks that occur
+    dist = dist[dist["count"] > 0]
     # pivot so each risk is a column (optional), but save long form as requested
-    return dist.sort_values(["city", "risk"])
+    # (crosstab rows/columns are already in category order)
+    return dist.reset_index(drop=True)
 
 # -----------------------------
 # D. Visualizations
 # -----------------------------
-def plot_histogram_pm25(df: pd.DataFrame, out_path: Path):
-    plt.figure(figsize=(8, 5))
+def _save(fig, ax, out_path: Path, cbar=None):
+    # draw once and hand the RGBA buffer to Pillow's fast (compress_level=1) PNG path
+    fig.canvas.draw()
+    Image.fromarray(np.asarray(fig.canvas.buffer_rgba())).save(out_path, compress_level=1)
+    if cbar is not None:
+        cbar.remove()  # give the shared axes its space back (before clear drops the mappable)
+    ax.clear()
+    print(f"Saved: {out_path}")
+
+def plot_histogram_pm25(df: pd.DataFrame, ax, out_path: Path):
     vals = df["pm2_5"].dropna()
     if vals.empty:
-        plt.text(0.5, 0.5, "No PM2.5 data", ha="center")
+        ax.text(0.5, 0.5, "No PM2.5 data", ha="center")
     else:
-        plt.hist(vals, bins=30)
-        plt.xlabel("PM2.5 (µg/m³)")
-        plt.ylabel("Frequency")
-        plt.title("Histogram of PM2.5")
-    plt.tight_layout()
-    plt.savefig(out_path)
-    plt.close()
-    print(f"Saved: {out_path}")
+        ax.hist(vals.to_numpy(), bins=30)
+        ax.set_xlabel("PM2.5 (µg/m³)")
+        ax.set_ylabel("Frequency")
+        ax.set_title("Histogram of PM2.5")
+    _save(ax.figure, ax, out_path)
 
-def plot_risk_flags_by_city(df: pd.DataFrame, out_path: Path):
+def plot_risk_flags_by_city(df: pd.DataFrame, ax, out_path: Path):
     # Count risk flags per city (stacked bar)
     if df.empty:
         pd.DataFrame().to_csv(out_path)  # touch file
         return
-    pivot = (df.assign(risk=df["risk_flag"].astype("string").str.strip().str.title().fillna("Unknown"))
-               .pivot_table(index="city", columns="risk", values="time", aggfunc="count", fill_value=0))
-    pivot.plot(kind="bar", stacked=True, figsize=(10, 6))
-    plt.title("Risk Flags by City (counts)")
-    plt.ylabel("Count")
-    plt.xlabel("City")
-    plt.tight_layout()
-    plt.savefig(out_path)
-    plt.close()
-    print(f"Saved: {out_path}")
-
-def plot_hourly_pm25_trends(trends_df: pd.DataFrame, out_path: Path):
+    pivot = df.pivot_table(index="city", columns="risk_flag_norm", values="time",
+                           aggfunc="count", fill_value=0, observed=True)
+    pivot.plot(kind="bar", stacked=True, ax=ax)
+    ax.set_title("Risk Flags by City (counts)")
+    ax.set_ylabel("Count")
+    ax.set_xlabel("City")
+    _save(ax.figure, ax, out_path)
+
+def plot_hourly_pm25_trends(trends_df: pd.DataFrame, ax, out_path: Path):
     # plot average hourly pm2_5 per city (time series)
     if trends_df.empty:
-        plt.figure(); plt.text(0.5, 0.5, "No trend data", ha="center"); plt.axis("off")
-        plt.savefig(out_path); plt.close(); return
+        ax.text(0.5, 0.5, "No trend data", ha="center"); ax.axis("off")
+        _save(ax.figure, ax, out_path); return
 
     # For readability, resample to hourly average per city (if multiple per hour)
     trends_df = trends_df.dropna(subset=["time"])
-    trends_df["time_round"] = pd.to_datetime(trends_df["time"]).dt.floor("H")
-    agg = trends_df.groupby(["city", "time_round"])["pm2_5"].mean().reset_index()
-    plt.figure(figsize=(12, 6))
-    for city, g in agg.groupby("city"):
-        plt.plot(g["time_round"], g["pm2_5"], label=city)
-    plt.legend()
-    plt.xlabel("Time")
-    plt.ylabel("PM2.5 (µg/m³)")
-    plt.title("Hourly PM2.5 Trends by City")
-    plt.tight_layout()
-    plt.savefig(out_path)
-    plt.close()
-    print(f"Saved: {out_path}")
-
-def plot_severity_vs_pm25(df: pd.DataFrame, out_path: Path):
-    plt.figure(figsize=(8, 6))
+    agg = (trends_df.set_index("time")
+                    .groupby("city", sort=False, observed=True)["pm2_5"]
+                    .resample("1h").mean()
+                    .reset_index())
+    for city, g in agg.groupby("city", sort=False, observed=True):
+        ax.plot(g["time"].to_numpy(), g["pm2_5"].to_numpy(), label=city)
+    ax.legend()
+    ax.set_xlabel("Time")
+    ax.set_ylabel("PM2.5 (µg/m³)")
+    ax.set_title("Hourly PM2.5 Trends by City")
+    _save(ax.figure, ax, out_path)
+
+def plot_severity_vs_pm25(df: pd.DataFrame, ax, out_path: Path):
+    fig = ax.figure
+    cbar = None
     sub = df.dropna(subset=["severity_score", "pm2_5"])
     if sub.empty:
-        plt.text(0.5, 0.5, "Not enough data", ha="center")
+        ax.text(0.5, 0.5, "Not enough data", ha="center")
     else:
-        plt.scatter(sub["pm2_5"], sub["severity_score"], alpha=0.6)
-        plt.xlabel("PM2.5 (µg/m³)")
-        plt.ylabel("Severity Score")
-        plt.title("Severity Score vs PM2.5")
-    plt.tight_layout()
-    plt.savefig(out_path)
-    plt.close()
-    print(f"Saved: {out_path}")
+        x = sub["pm2_5"].to_numpy()
+        y = sub["severity_score"].to_numpy()
+        if len(sub) > DENSITY_THRESHOLD:
+            # one C pass into a fixed grid; render cost is independent of N
+            grid, xedges, yedges = np.histogram2d(x, y, bins=DENSITY_BINS)
+            im = ax.imshow(np.log1p(grid.T), origin="lower", aspect="auto", cmap="viridis",
+                           extent=[xedges[0], xedges[-1], yedges[0], yedges[-1]])
+            cbar = fig.colorbar(im, ax=ax, label="log(1 + count)")
+        else:
+            ax.scatter(x, y, alpha=0.6)
+        ax.set_xlabel("PM2.5 (µg/m³)")
+        ax.set_ylabel("Severity Score")
+        ax.set_title("Severity Score vs PM2.5")
+    _save(fig, ax, out_path, cbar)
 
 # -----------------------------
 # Export CSVs
 # -----------------------------
-def export_csv(df_summary: pd.DataFrame, df_risk: pd.DataFrame, df_trends: pd.DataFrame):
-    df_summary.to_csv(SUMMARY_CSV, index=False)
+def _float_text(arr) -> pa.ChunkedArray:
+    """Floats as DataFrame.to_csv writes them: integral values keep ".0", NaN is empty."""
+    text = pc.replace_substring_regex(pc.cast(arr, pa.string()), r"^(-?\d+)$", r"\1.0")
+    return pc.if_else(pc.is_nan(arr), pa.scalar(None, pa.string()), text)
+
+def _write_csv(data: Union[pd.DataFrame, pa.Table], path: Path):
+    """
+    Write via Arrow's C CSV writer; accepts a DataFrame or an Arrow Table.
+    Output bytes match DataFrame.to_csv(index=False): unquoted fields, floats like "119.0".
+    Values that need quoting (delimiter, quote, newline) go through to_csv itself.
+    """
+    if isinstance(data, pd.DataFrame):
+        # mixed-type object columns (e.g. summary "value") are written as text
+        obj_cols = data.select_dtypes(include="object").columns
+        data = pa.Table.from_pandas(data.astype({c: "string" for c in obj_cols}), preserve_index=False)
+    for i, field in enumerate(data.schema):
+        if pa.types.is_floating(field.type):
+            data = data.set_column(i, field.name, _float_text(data[field.name]))
+    try:
+        pacsv.write_csv(data, path, pacsv.WriteOptions(quoting_style="none", quoting_header="none",
+                                                       eol=os.linesep))
+    except (pa.ArrowInvalid, TypeError):
+        data.to_pandas().to_csv(path, index=False)
+
+def export_csv(df_summary: Union[pd.DataFrame, pa.Table],
+               df_risk: Union[pd.DataFrame, pa.Table],
+               df_trends: Union[pd.DataFrame, pa.Table]):
+    _write_csv(df_summary, SUMMARY_CSV)
     print(f"Saved summary metrics CSV: {SUMMARY_CSV}")
-    df_risk.to_csv(RISK_DIST_CSV, index=False)
+    _write_csv(df_risk, RISK_DIST_CSV)
     print(f"Saved city risk distribution CSV: {RISK_DIST_CSV}")
-    df_trends.to_csv(TRENDS_CSV, index=False)
+    _write_csv(df_trends, TRENDS_CSV)
     print(f"Saved pollution trends CSV: {TRENDS_CSV}")
 
 # -----------------------------
@@ -311,11 +472,14 @@ def main():
     # 5) export CSVs
     export_csv(df_metrics, df_risk, df_trends)
 
-    # 6) visualizations
-    plot_histogram_pm25(df, PLOTS_DIR / "histogram_pm25.png")
-    plot_risk_flags_by_city(df, PLOTS_DIR / "risk_flags_by_city.png")
-    plot_hourly_pm25_trends(df_trends, PLOTS_DIR / "hourly_pm25_trends.png")
-    plot_severity_vs_pm25(df, PLOTS_DIR / "severity_vs_pm25_scatter.png")
+    # 6) visualizations (one figure/axes reused, fixed margins instead of tight_layout)
+    fig, ax = plt.subplots(figsize=FIGSIZE, dpi=PLOT_DPI)
+    fig.subplots_adjust(left=0.1, right=0.95, bottom=0.18, top=0.92)
+    plot_histogram_pm25(df, ax, PLOTS_DIR / "histogram_pm25.png")
+    plot_risk_flags_by_city(df, ax, PLOTS_DIR / "risk_flags_by_city.png")
+    plot_hourly_pm25_trends(df_trends, ax, PLOTS_DIR / "hourly_pm25_trends.png")
+    plot_severity_vs_pm25(df, ax, PLOTS_DIR / "severity_vs_pm25_scatter.png")
+    plt.close(fig)
 
     print("\n🎉 ETL Analysis completed. CSVs and PNGs saved under:", PROCESSED_DIR)
 
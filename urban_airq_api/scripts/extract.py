@@ -12,14 +12,14 @@ Urban Air Quality Monitoring – Extract Step (OpenAQ v3 + Open-Meteo fallback)
 - Saves raw data: data/raw/<city>_raw_<timestamp>.json
 """
 
-import json
+import asyncio
 import os
-import time
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Optional, List
 
-import requests
+import httpx
+import orjson
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -59,8 +59,9 @@ def ts():
 def save_raw(city: str, payload):
     filename = f"{city.lower()}_raw_{ts()}.json"
     path = RAW_DIR / filename
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2, ensure_ascii=False)
+    # compact UTF-8 JSON bytes; transform parses them back with orjson.loads (mmap-backed for files >= 1 MB)
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS))
     return str(path.resolve())
 
 
@@ -68,10 +69,9 @@ def save_raw(city: str, payload):
 # API Callers
 # -----------------------------------------------------
 
-def call_openaq_v3(city: str) -> Optional[dict]:
+async def call_openaq_v3(client: httpx.AsyncClient, city: str) -> Optional[dict]:
     """Primary API → OpenAQ v3"""
-    url = f"{OPENAQ_BASE}?city={city}"
-    resp = requests.get(url, timeout=TIMEOUT)
+    resp = await client.get(OPENAQ_BASE, params={"city": city})
     if resp.status_code == 200:
         data = resp.json()
         if data.get("results"):
@@ -79,14 +79,14 @@ def call_openaq_v3(city: str) -> Optional[dict]:
     return None
 
 
-def call_open_meteo(lat: float, lon: float) -> Optional[dict]:
+async def call_open_meteo(client: httpx.AsyncClient, lat: float, lon: float) -> Optional[dict]:
     """Fallback API → Open-Meteo Air Quality"""
     params = {
         "latitude": lat,
         "longitude": lon,
         "hourly": "pm10,pm2_5,carbon_monoxide,nitrogen_dioxide,ozone,sulphur_dioxide",
     }
-    resp = requests.get(OPEN_METEO_BASE, params=params, timeout=TIMEOUT)
+    resp = await client.get(OPEN_METEO_BASE, params=params)
     if resp.status_code == 200:
         return resp.json()
     return None
@@ -96,47 +96,66 @@ def call_open_meteo(lat: float, lon: float) -> Optional[dict]:
 # ETL Extract Logic
 # -----------------------------------------------------
 
-def fetch_city(city: str, info: dict):
+async def fetch_city(client: httpx.AsyncClient, city: str, info: dict):
     """Fetch using OpenAQ v3 → fallback Open-Meteo"""
     print(f"\n➡️ Fetching: {city}")
 
     # Try OpenAQ with retries
     for attempt in range(1, MAX_RETRIES + 1):
         try:
-            print(f"   🌐 OpenAQ v3 attempt {attempt}/{MAX_RETRIES}...")
-            data = call_openaq_v3(city)
+            print(f"   🌐 [{city}] OpenAQ v3 attempt {attempt}/{MAX_RETRIES}...")
+            data = await call_openaq_v3(client, city)
             if data:
                 path = save_raw(city, data)
-                print(f"   ✅ OpenAQ success → saved: {path}")
+                print(f"   ✅ [{city}] OpenAQ success → saved: {path}")
                 return {"city": city, "source": "OpenAQ", "raw_path": path}
         except Exception as e:
-            print(f"   ⚠️ OpenAQ error: {e}")
+            print(f"   ⚠️ [{city}] OpenAQ error: {e}")
 
         wait = 2 ** (attempt - 1)
-        print(f"   ⏳ retrying in {wait}s...")
-        time.sleep(wait)
+        print(f"   ⏳ [{city}] retrying in {wait}s...")
+        await asyncio.sleep(wait)
 
-    print(f"   ❌ OpenAQ failed → trying fallback Open-Meteo")
+    print(f"   ❌ [{city}] OpenAQ failed → trying fallback Open-Meteo")
 
     # fallback
     lat = info["lat"]
     lon = info["lon"]
-    fallback = call_open_meteo(lat, lon)
+    try:
+        fallback = await call_open_meteo(client, lat, lon)
+    except Exception as e:
+        print(f"   ⚠️ [{city}] Open-Meteo error: {e}")
+        fallback = None
 
     if fallback:
         path = save_raw(city, fallback)
-        print(f"   🟡 Fallback Open-Meteo success → saved: {path}")
+        print(f"   🟡 [{city}] Fallback Open-Meteo success → saved: {path}")
         return {"city": city, "source": "Open-Meteo", "raw_path": path}
 
     print(f"   🔥 BOTH APIs FAILED for {city}")
     return {"city": city, "source": None, "raw_path": None}
 
 
+async def fetch_all_async(queue: Optional[asyncio.Queue] = None) -> List[Dict]:
+    """
+    Fetch every city concurrently over one pooled client.
+    If a queue is given, each city's result is also put on it as soon as it is saved,
+    so a consumer (run_pipeline) can start transforming before the slowest city lands.
+    """
+    async def fetch_one(client, city, info):
+        result = await fetch_city(client, city, info)
+        if queue is not None:
+            await queue.put(result)
+        return result
+
+    async with httpx.AsyncClient(timeout=TIMEOUT) as client:
+        return list(await asyncio.gather(
+            *(fetch_one(client, city, info) for city, info in DEFAULT_CITIES.items())
+        ))
+
+
 def fetch_all():
-    results = []
-    for city, info in DEFAULT_CITIES.items():
-        results.append(fetch_city(city, info))
-    return results
+    return asyncio.run(fetch_all_async())
 
 
 # -----------------------------------------------------
@@ -5,14 +5,20 @@ Load transformed air-quality dataset into Supabase using the supabase client.
 Creates table (if possible) and inserts rows in batches with retries.
 """
 
+import asyncio
+import csv
+import importlib.util
 import os
 import math
-import time
-from typing import List, Dict, Any
+from functools import lru_cache
 from pathlib import Path
 
-import pandas as pd
-import numpy as np
+import httpx
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
@@ -21,13 +27,36 @@ load_dotenv()
 # CONFIG
 BATCH_SIZE = int(os.getenv("BATCH_SIZE", "200"))
 RETRY_COUNT = int(os.getenv("RETRY_COUNT", "2"))  # number of retries in addition to first attempt
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "8"))  # batches in flight at once
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-STAGED_DEFAULT = os.getenv("STAGED_CSV", str(Path(__file__).resolve().parents[0] / "data" / "staged" / "air_quality_transformed.csv"))
+# DB columns in canonical order, with the types the staged file is read into
+STAGED_SCHEMA = pa.schema([
+    ("city", pa.string()),
+    ("time", pa.timestamp("us")),  # naive UTC like the TIMESTAMP column; keeps OpenAQ's milliseconds
+    ("pm10", pa.float64()),
+    ("pm2_5", pa.float64()),
+    ("carbon_monoxide", pa.float64()),
+    ("nitrogen_dioxide", pa.float64()),
+    ("sulphur_dioxide", pa.float64()),
+    ("ozone", pa.float64()),
+    ("uv_index", pa.float64()),
+    ("aqi_category", pa.string()),
+    ("severity_score", pa.float64()),
+    ("risk_flag", pa.string()),
+    ("hour", pa.int32()),
+])
+EXPECTED_COLS = STAGED_SCHEMA.names
+# transform output names -> DB names (after lower-casing)
+COLUMN_ALIASES = {"risk_level": "risk_flag", "risk": "risk_flag"}
+
+STAGED_DEFAULT = os.getenv("STAGED_CSV", str(Path(__file__).resolve().parents[0] / "data" / "staged" / "air_quality_transformed.parquet"))
 
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise SystemExit("❌ SUPABASE_URL and SUPABASE_KEY must be set in environment (.env)")
 
+@lru_cache(maxsize=1)
 def get_supabase_client() -> Client:
     return create_client(SUPABASE_URL, SUPABASE_KEY)
 
@@ -64,180 +93,136 @@ def create_table_if_not_exists():
         print(f"⚠️ Error checking/creating table: {e}")
         print("ℹ️ Will continue and attempt insertion (may fail if table does not exist).")
 
-def _read_staged(staged_path: str) -> pd.DataFrame:
-    path = Path(staged_path)
-    if not path.exists():
-        raise FileNotFoundError(f"Staged CSV not found at: {path}")
-    df = pd.read_csv(path)
-    print(f"📥 Loaded staged CSV: {path}  rows={len(df)} cols={len(df.columns)}")
-    return df
-
-def _normalize_for_insert(df: pd.DataFrame) -> pd.DataFrame:
+def _column_map(header) -> dict:
+    """Source column -> DB column; exact (case-insensitive) names win over aliases."""
+    name_for = {}
+    for src in header:
+        if src.lower() in EXPECTED_COLS and src.lower() not in name_for.values():
+            name_for[src] = src.lower()
+    for src in header:
+        alias = COLUMN_ALIASES.get(src.lower())
+        if alias and alias not in name_for.values():
+            name_for[src] = alias
+    return name_for
+
+def _read_staged_csv(path: Path):
+    """Legacy CSV staging: parse only the DB columns with their types (multithreaded C parser)."""
+    with open(path, newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f), [])
+    name_for = _column_map(header)
+
+    # hour is parsed as float (pandas writes "3.0" when the column had NaN) and cast below
+    column_types = {src: (pa.float64() if name == "hour" else STAGED_SCHEMA.field(name).type)
+                    for src, name in name_for.items()}
+    tbl = pacsv.read_csv(
+        path,
+        read_options=pacsv.ReadOptions(use_threads=True),
+        convert_options=pacsv.ConvertOptions(column_types=column_types,
+                                             include_columns=list(name_for),
+                                             strings_can_be_null=True),
+    )
+    return tbl, header, name_for
+
+def _read_staged(staged_path: str) -> pa.Table:
     """
-    - Normalize column names to match DB (lowercase).
-    - Ensure required columns exist (add None if missing).
-    - Convert time -> ISO strings (or None).
-    - Replace NaN with None.
-    - Ensure numeric columns are numeric.
+    Read the staged Parquet (or legacy CSV) file straight into an Arrow table shaped like the DB:
+    - Map column names to DB names (lowercase, risk_level -> risk_flag).
+    - Read only the DB columns (Parquet is already typed; CSV is parsed with DB types).
+    - Add missing DB columns as nulls, in canonical order.
     """
-    # canonical column mapping: expected DB column names
-    expected_cols = [
-        "city", "time", "pm10", "pm2_5", "carbon_monoxide",
-        "nitrogen_dioxide", "sulphur_dioxide", "ozone", "uv_index",
-        "aqi_category", "severity_score", "risk_flag", "hour"
-    ]
-
-    # lowercase existing columns to make matching easier
-    df = df.rename(columns={c: c.lower() for c in df.columns})
-
-    # if transform used different names, attempt some common maps
-    rename_map = {}
-    if "aqi_category" not in df.columns and "aqi_category".upper() in df.columns:
-        rename_map["AQI_Category"] = "aqi_category"
-    if "risk_flag" not in df.columns:
-        if "risk_level" in df.columns:
-            rename_map["risk_level"] = "risk_flag"
-        if "risk" in df.columns:
-            rename_map["risk"] = "risk_flag"
-    if rename_map:
-        df = df.rename(columns=rename_map)
-
-    # ensure columns exist
-    for col in expected_cols:
-        if col not in df.columns:
-            df[col] = None
-
-    # normalize time -> ISO string (Postgres accepts ISO-8601)
-    df["time"] = pd.to_datetime(df["time"], errors="coerce")
-    df["time"] = df["time"].apply(lambda t: t.isoformat() if pd.notnull(t) else None)
-
-    # numeric conversions
-    num_cols = ["pm10", "pm2_5", "carbon_monoxide", "nitrogen_dioxide", "sulphur_dioxide", "ozone", "uv_index", "severity_score", "hour"]
-    for col in num_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
-
-    # hour integer-safe
-    if "hour" in df.columns:
-        try:
-            df["hour"] = df["hour"].astype("Int64")
-        except Exception:
-            pass
-
-    # convert pandas NA/NaN -> None
-    df = df.where(pd.notnull(df), None)
+    path = Path(staged_path)
+    if not path.exists():
+        raise FileNotFoundError(f"Staged file not found at: {path}")
+
+    if path.suffix == ".parquet":
+        header = pq.read_schema(path).names
+        name_for = _column_map(header)
+        tbl = pq.read_table(path, columns=list(name_for))
+    else:
+        tbl, header, name_for = _read_staged_csv(path)
+    tbl = tbl.rename_columns([name_for[src] for src in tbl.column_names])
+
+    columns = []
+    for field in STAGED_SCHEMA:
+        if field.name in tbl.column_names:
+            col = tbl[field.name]
+            if pa.types.is_float32(col.type) and pa.types.is_float64(field.type):
+                # widen via shortest decimal text so 53.3 stays 53.3 (not 53.29999923706055)
+                col = pc.cast(col, pa.string())
+            columns.append(pc.cast(col, field.type))
+        else:
+            columns.append(pa.nulls(tbl.num_rows, field.type))
+    tbl = pa.Table.from_arrays(columns, schema=STAGED_SCHEMA)
+    print(f"📥 Loaded staged file: {path}  rows={tbl.num_rows} cols={len(header)}")
+    return tbl
+
+async def _insert_batches_async(tbl: pa.Table, table_name: str):
+    """POST BATCH_SIZE slices of tbl straight to the PostgREST endpoint, MAX_CONCURRENCY at a time."""
+    url = f"{SUPABASE_URL}/rest/v1/{table_name}"
+    headers = {
+        "apikey": SUPABASE_KEY,
+        "Authorization": f"Bearer {SUPABASE_KEY}",
+        "Prefer": "return=minimal",
+        "Content-Type": "application/json",
+    }
+    total = tbl.num_rows
+    batch_count = math.ceil(total / BATCH_SIZE)
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    limits = httpx.Limits(max_connections=MAX_CONCURRENCY, max_keepalive_connections=MAX_CONCURRENCY)
+    # HTTP/2 needs the optional h2 package (shipped with supabase's httpx[http2])
+    http2 = importlib.util.find_spec("h2") is not None
+
+    async with httpx.AsyncClient(http2=http2, headers=headers, limits=limits, timeout=HTTP_TIMEOUT) as client:
+
+        async def post_batch(batch_no: int, offset: int):
+            async with sem:
+                # only in-flight batches are materialized as dicts (zero-copy slice until here);
+                # Arrow nulls arrive as None, so no NaN scrubbing is needed
+                batch = tbl.slice(offset, BATCH_SIZE).to_pylist()
+                body = orjson.dumps(batch)
+                last_err = None
+                for attempt in range(1, RETRY_COUNT + 2):
+                    try:
+                        response = await client.post(url, content=body)
+                        if response.is_success:
+                            start = (batch_no - 1) * BATCH_SIZE + 1
+                            end = min(batch_no * BATCH_SIZE, total)
+                            print(f"✅ Inserted rows {start}-{end} (batch {batch_no}/{batch_count})")
+                            return len(batch), None
+                        last_err = f"HTTP {response.status_code}: {response.text[:200]}"
+                        print(f"⚠️ [batch {batch_no}/{batch_count}] attempt {attempt} failed: {last_err}")
+                    except httpx.HTTPError as e:
+                        last_err = str(e)
+                        print(f"⚠️ [batch {batch_no}/{batch_count}] attempt {attempt} exception: {e}")
+                    if attempt <= RETRY_COUNT:
+                        backoff = 2 ** (attempt - 1)
+                        print(f"   ⏳ Retrying batch {batch_no} in {backoff}s ...")
+                        await asyncio.sleep(backoff)
+                return 0, {"batch": batch_no, "size": len(batch), "error": last_err}
 
-    return df[expected_cols]  # return only DB columns in canonical order
+        results = await asyncio.gather(*(post_batch(n, off)
+                                         for n, off in enumerate(range(0, total, BATCH_SIZE), start=1)))
 
-def _normalize_record_types(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """
-    Convert numpy scalars and other types to native Python types and lower-case keys.
-    """
-    normalized = []
-    for rec in records:
-        r2 = {}
-        for k, v in rec.items():
-            key = k.lower()
-            if v is None:
-                r2[key] = None
-                continue
-            # numpy types
-            if isinstance(v, (np.integer,)):
-                r2[key] = int(v)
-            elif isinstance(v, (np.floating,)):
-                # convert floats that are integral to int
-                if float(v).is_integer():
-                    r2[key] = int(float(v))
-                else:
-                    r2[key] = float(v)
-            elif isinstance(v, (np.bool_,)):
-                r2[key] = bool(v)
-            elif isinstance(v, (np.datetime64,)):
-                # ensure ISO string
-                try:
-                    ts = pd.to_datetime(v).isoformat()
-                    r2[key] = ts
-                except Exception:
-                    r2[key] = str(v)
-            else:
-                r2[key] = v
-        normalized.append(r2)
-    return normalized
+    inserted = sum(n for n, _ in results)
+    failed_batches = [fb for _, fb in results if fb]
+    return inserted, failed_batches
 
 def load_to_supabase(staged_path: str = STAGED_DEFAULT, table_name: str = "air_quality_data"):
     try:
-        df = _read_staged(staged_path)
+        tbl = _read_staged(staged_path)
     except Exception as e:
-        print(f"❌ Failed to read staged CSV: {e}")
+        print(f"❌ Failed to read staged file: {e}")
         return
 
-    df_norm = _normalize_for_insert(df)
-    records = df_norm.to_dict(orient="records")
-    total = len(records)
+    total = tbl.num_rows
     if total == 0:
         print("❌ No records to insert.")
         return
 
-    supabase = get_supabase_client()
-    inserted = 0
-    failed_batches = []
-
-    print(f"🔄 Inserting {total} records into '{table_name}' in batches of {BATCH_SIZE} (retries={RETRY_COUNT})")
-
-    batch_count = math.ceil(total / BATCH_SIZE)
-    for i in range(0, total, BATCH_SIZE):
-        batch_no = (i // BATCH_SIZE) + 1
-        batch = records[i: i + BATCH_SIZE]
-        # defensive cleaning: replace float('nan') with None
-        for rec in batch:
-            for k, v in list(rec.items()):
-                if isinstance(v, float) and math.isnan(v):
-                    rec[k] = None
-
-        # normalize types and keys
-        batch = _normalize_record_types(batch)
-
-        attempt = 0
-        success = False
-        last_err = None
-        while attempt <= RETRY_COUNT and not success:
-            attempt += 1
-            try:
-                response = supabase.table(table_name).insert(batch).execute()
-                # supabase client returns object with status_code, data, error in older/new versions; handle both patterns
-                err = None
-                if hasattr(response, "error") and response.error:
-                    err = response.error
-                elif isinstance(response, dict) and response.get("error"):
-                    err = response.get("error")
-                elif isinstance(response, tuple) and len(response) >= 2:
-                    # some client versions return (data, count) or similar; assume success
-                    err = None
-
-                if err:
-                    last_err = err
-                    print(f"⚠️ [batch {batch_no}/{batch_count}] attempt {attempt} failed: {err}")
-                    if attempt <= RETRY_COUNT:
-                        backoff = 2 ** (attempt - 1)
-                        print(f"   ⏳ Retrying batch {batch_no} in {backoff}s ...")
-                        time.sleep(backoff)
-                else:
-                    # success
-                    inserted += len(batch)
-                    success = True
-                    start = i + 1
-                    end = min(i + BATCH_SIZE, total)
-                    print(f"✅ Inserted rows {start}-{end} (batch {batch_no}/{batch_count})")
-            except Exception as e:
-                last_err = str(e)
-                print(f"⚠️ [batch {batch_no}/{batch_count}] attempt {attempt} exception: {e}")
-                if attempt <= RETRY_COUNT:
-                    backoff = 2 ** (attempt - 1)
-                    print(f"   ⏳ Retrying batch {batch_no} in {backoff}s ...")
-                    time.sleep(backoff)
+    print(f"🔄 Inserting {total} records into '{table_name}' in batches of {BATCH_SIZE} "
+          f"(retries={RETRY_COUNT}, concurrency={MAX_CONCURRENCY})")
 
-        if not success:
-            failed_batches.append({"batch": batch_no, "size": len(batch), "error": last_err})
+    inserted, failed_batches = asyncio.run(_insert_batches_async(tbl, table_name))
 
     # summary
     print("\n=== LOAD SUMMARY ===")
@@ -258,5 +243,5 @@ def load_to_supabase(staged_path: str = STAGED_DEFAULT, table_name: str = "air_q
 if __name__ == "__main__":
     # create table (best-effort)
     create_table_if_not_exists()
-    staged = str(Path(__file__).resolve().parents[0] / "data" / "staged" / "air_quality_transformed.csv")
-    load_to_supabase(staged)
+    # STAGED_CSV (set by run_pipeline's fallback) overrides the default staged file
+    load_to_supabase(STAGED_DEFAULT)
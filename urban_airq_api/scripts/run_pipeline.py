@@ -8,15 +8,23 @@ Run the full ETL pipeline:
 
 This runner tries to call functions from the modules if available, and
 falls back to invoking the scripts with Python if imports fail.
+When both modules expose the streaming hooks, extract and transform overlap:
+each city's raw file is flattened as soon as it lands.
 """
 
 from __future__ import annotations
+import asyncio
 import importlib
+import importlib.util
+import os
+import runpy
 import subprocess
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import cache
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 
 ROOT = Path(__file__).resolve().parents[0]
 DATA_RAW = ROOT / "data" / "raw"
@@ -29,23 +37,86 @@ DATA_STAGED.mkdir(parents=True, exist_ok=True)
 DATA_PROCESSED.mkdir(parents=True, exist_ok=True)
 
 
+@cache
 def try_import(module_name: str):
+    # memoized: each step module is resolved (or found missing) once per process
     try:
+        # cheap finder lookup first: a missing module never reaches the import machinery
+        if importlib.util.find_spec(module_name) is None:
+            return None
         return importlib.import_module(module_name)
     except Exception:
         return None
 
 
-def run_subprocess(script: Path) -> int:
+# Entry-point names probed on each step module, in order of preference
+_FN_PROBES = {
+    "extract": ("fetch_all_raw", "fetch_all", "fetch_all_cities", "extract_weather_data", "run_extract"),
+    "transform": ("transform_data", "transform", "run_transform"),
+    "load": ("load_to_supabase",),
+    "etl_analysis": ("main", "run_analysis", "run"),
+}
+
+
+@cache
+def _resolve(module_name: str) -> tuple:
+    """(name, fn) for each callable probe the module defines; resolved once per process."""
+    mod = try_import(module_name)
+    if mod is None:
+        return ()
+    found = ((name, getattr(mod, name, None)) for name in _FN_PROBES[module_name])
+    return tuple((name, fn) for name, fn in found if callable(fn))
+
+
+def scan_files(folder: Path, suffix: str = "") -> List[os.DirEntry]:
+    """Regular files in folder ending with suffix (DirEntry stat info is cached per entry)."""
+    with os.scandir(folder) as it:
+        return [e for e in it if e.name.endswith(suffix) and e.is_file()]
+
+
+def run_subprocess(script: Path, env: Optional[Dict[str, str]] = None) -> int:
     """
     Run 'python <script>' and stream output to console.
     Returns the script exit code.
     """
     print(f"🧪 Running script fallback: python {script}")
-    completed = subprocess.run([sys.executable, str(script)], cwd=str(ROOT))
+    completed = subprocess.run([sys.executable, str(script)], cwd=str(ROOT),
+                               env={**os.environ, **env} if env else None)
     return completed.returncode
 
 
+def run_script(script: Path, env: Optional[Dict[str, str]] = None) -> int:
+    """
+    Run <script> as __main__ inside this interpreter (no new python + pandas import),
+    from ROOT and with extra env vars. Falls back to a subprocess only if the
+    script cannot be imported in-process. Returns the script exit code.
+    """
+    print(f"🧪 Running script fallback in-process: {script.name}")
+    prev_cwd, prev_argv, prev_env = os.getcwd(), sys.argv, dict(os.environ)
+    try:
+        os.chdir(ROOT)
+        sys.argv = [str(script)]
+        os.environ.update(env or {})
+        runpy.run_path(str(script), run_name="__main__")
+        return 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code)
+        return 1
+    except ImportError as e:
+        print(f"⚠️ {script.name} could not run in-process ({e}); using a subprocess.")
+        return run_subprocess(script, env)
+    except Exception as e:
+        print(f"⚠️ {script.name} raised: {e}")
+        return 1
+    finally:
+        os.chdir(prev_cwd)
+        sys.argv = prev_argv
+        os.environ.clear()
+        os.environ.update(prev_env)
+
+
 # ---------------------------
 # 1) Extract
 # ---------------------------
@@ -58,40 +129,36 @@ def run_extract() -> List[Dict[str, Any]]:
     or a list of saved raw file paths if that's what the extract returns.
     """
     print("\n=== STEP 1: EXTRACT ===")
-    mod = try_import("extract")
     results: List[Dict[str, Any]] = []
 
-    if mod:
-        # Try common function names in order of preference
-        for fn_name in ("fetch_all_raw", "fetch_all", "fetch_all_cities", "extract_weather_data", "fetch_all_cities", "run_extract"):
-            fn = getattr(mod, fn_name, None)
-            if callable(fn):
-                try:
-                    print(f"Calling extract.{fn_name}() ...")
-                    out = fn()
-                    # normalize return types
-                    if isinstance(out, list):
-                        results = out
-                    elif isinstance(out, dict):
-                        # single result -> wrap
-                        results = [out]
-                    elif isinstance(out, str):
-                        results = [{"raw_path": out}]
-                    else:
-                        results = []
-                    print("✅ Extract finished (imported function).")
-                    return results
-                except Exception as e:
-                    print(f"⚠️ extract.{fn_name}() raised exception: {e}")
-                    # try next fallback
+    # Try common function names in order of preference
+    for fn_name, fn in _resolve("extract"):
+        try:
+            print(f"Calling extract.{fn_name}() ...")
+            out = fn()
+            # normalize return types
+            if isinstance(out, list):
+                results = out
+            elif isinstance(out, dict):
+                # single result -> wrap
+                results = [out]
+            elif isinstance(out, str):
+                results = [{"raw_path": out}]
+            else:
+                results = []
+            print("✅ Extract finished (imported function).")
+            return results
+        except Exception as e:
+            print(f"⚠️ extract.{fn_name}() raised exception: {e}")
+            # try next fallback
     # fallback: run script
     script = ROOT / "extract.py"
     if script.exists():
-        code = run_subprocess(script)
+        code = run_script(script)
         if code == 0:
             # collect raw files produced in data/raw (newest ones)
-            paths = sorted(DATA_RAW.glob("*"), key=lambda p: p.stat().st_mtime)
-            results = [{"raw_path": str(p)} for p in paths]
+            entries = sorted(scan_files(DATA_RAW), key=lambda e: e.stat().st_mtime)
+            results = [{"raw_path": e.path} for e in entries]
             print(f"✅ Extract fallback produced {len(results)} raw files.")
             return results
         else:
@@ -104,67 +171,132 @@ def run_extract() -> List[Dict[str, Any]]:
 # ---------------------------
 def run_transform(extract_results: List[Dict[str, Any]]) -> Optional[str]:
     """
-    Attempts to run transform. Returns the path to the staged CSV if found.
+    Attempts to run transform. Returns the path to the staged file if found.
     """
     print("\n=== STEP 2: TRANSFORM ===")
-    mod = try_import("transform")
-
-    # Prefer transform.transform_data(raw_paths) style
-    if mod:
-        # try a few function names
-        for fn_name in ("transform_data", "transform", "run_transform"):
-            fn = getattr(mod, fn_name, None)
-            if callable(fn):
-                try:
-                    print(f"Calling transform.{fn_name}() ...")
-                    # if transform expects a list of raw paths, provide them
-                    raw_paths = []
-                    for r in extract_results:
-                        if isinstance(r, dict) and r.get("raw_path"):
-                            raw_paths.append(r["raw_path"])
-                        elif isinstance(r, str):
-                            raw_paths.append(r)
-                    # Call with raw_paths if function accepts args
-                    try:
-                        staged = fn(raw_paths) if raw_paths else fn()
-                    except TypeError:
-                        staged = fn()
-                    # If function returned path or list
-                    if isinstance(staged, str):
-                        print(f"✅ Transform returned staged file: {staged}")
-                        return staged
-                    if isinstance(staged, list) and staged:
-                        # assume first staged file
-                        print(f"✅ Transform returned staged files: {staged}")
-                        return staged[0]
-                    # else continue to fallback
-                    print("✅ Transform function completed (no path returned). Will search staged dir.")
-                    break
-                except Exception as e:
-                    print(f"⚠️ transform.{fn_name}() raised exception: {e}")
-                    # try next
+    # Prefer transform.transform_data(raw_paths) style; try a few function names
+    for fn_name, fn in _resolve("transform"):
+        try:
+            print(f"Calling transform.{fn_name}() ...")
+            # if transform expects a list of raw paths, provide them
+            raw_paths = []
+            for r in extract_results:
+                if isinstance(r, dict) and r.get("raw_path"):
+                    raw_paths.append(r["raw_path"])
+                elif isinstance(r, str):
+                    raw_paths.append(r)
+            # Call with raw_paths if function accepts args
+            try:
+                staged = fn(raw_paths) if raw_paths else fn()
+            except TypeError:
+                staged = fn()
+            # If function returned path or list
+            if isinstance(staged, str):
+                print(f"✅ Transform returned staged file: {staged}")
+                return staged
+            if isinstance(staged, list) and staged:
+                # assume first staged file
+                print(f"✅ Transform returned staged files: {staged}")
+                return staged[0]
+            # else continue to fallback
+            print("✅ Transform function completed (no path returned). Will search staged dir.")
+            break
+        except Exception as e:
+            print(f"⚠️ transform.{fn_name}() raised exception: {e}")
+            # try next
     # fallback: run script
     script = ROOT / "transform.py"
     if script.exists():
-        code = run_subprocess(script)
+        code = run_script(script)
         if code != 0:
             raise RuntimeError(f"transform.py exited with code {code}")
-    # After running transform (imported or fallback), try to locate the latest staged CSV
-    staged_files = sorted(DATA_STAGED.glob("*.csv"), key=lambda p: p.stat().st_mtime)
-    if staged_files:
-        print(f"✅ Found staged CSV: {staged_files[-1]}")
-        return str(staged_files[-1].resolve())
-    print("⚠️ No staged CSV found in data/staged/. Transform may have failed or produced a differently named file.")
+    # After running transform (imported or fallback), try to locate the latest staged Parquet file
+    newest = max(scan_files(DATA_STAGED, ".parquet"), key=lambda e: e.stat().st_mtime, default=None)
+    if newest is not None:
+        print(f"✅ Found staged file: {newest.path}")
+        return str(Path(newest.path).resolve())
+    print("⚠️ No staged Parquet file found in data/staged/. Transform may have failed or produced a differently named file.")
     return None
 
 
+# ---------------------------
+# 1+2) Extract + Transform (overlapped)
+# ---------------------------
+async def _extract_transform_async(extract_mod, transform_mod) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Producer: extract puts each city's result on a queue as soon as its raw file is saved.
+    Consumer: hands every landed file to the flatten process pool right away.
+    Raw files already in data/raw are flattened too, matching transform().
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    workers = max(1, getattr(transform_mod, "FLATTEN_WORKERS", 1))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def flatten(path):
+            return loop.run_in_executor(pool, transform_mod.flatten_file, path)
+
+        pending = [flatten(path) for path in transform_mod.iter_json_files()]
+
+        async def consume():
+            while (result := await queue.get()) is not None:
+                if isinstance(result, dict) and result.get("raw_path"):
+                    pending.append(flatten(result["raw_path"]))
+
+        consumer = asyncio.create_task(consume())
+        try:
+            results = await extract_mod.fetch_all_async(queue)
+            await queue.put(None)
+            await consumer
+            frames = await asyncio.gather(*pending)
+        except BaseException:
+            # drop queued flatten jobs and wait out the running ones before the pool shuts down
+            consumer.cancel()
+            for fut in pending:
+                fut.cancel()
+            await asyncio.gather(consumer, *pending, return_exceptions=True)
+            raise
+
+    print(f"📁 Flattened {len(frames)} raw files.")
+    return results, transform_mod.stage_frames(frames)
+
+
+def run_extract_transform() -> Optional[Tuple[List[Dict[str, Any]], Optional[str]]]:
+    """
+    Runs extract and transform overlapped. Returns (extract results, staged path),
+    or None if the modules lack the hooks or the overlapped run fails, in which case
+    the steps must run one after the other.
+    """
+    extract_mod, transform_mod = try_import("extract"), try_import("transform")
+    hooks = (getattr(extract_mod, "fetch_all_async", None),
+             *(getattr(transform_mod, name, None) for name in ("iter_json_files", "flatten_file", "stage_frames")))
+    if not all(callable(h) for h in hooks):
+        return None
+
+    print("\n=== STEP 1+2: EXTRACT + TRANSFORM (overlapped) ===")
+    prev_cwd = os.getcwd()
+    try:
+        # transform resolves data/raw and data/staged relative to the scripts folder
+        os.chdir(ROOT)
+        results, staged = asyncio.run(_extract_transform_async(extract_mod, transform_mod))
+        if staged is None:
+            raise RuntimeError("No valid raw data to stage.")
+    except Exception as e:
+        print(f"⚠️ Overlapped extract + transform failed: {e}. Falling back to sequential steps.")
+        return None
+    finally:
+        os.chdir(prev_cwd)
+    print(f"✅ Extract + transform finished → {staged}")
+    return results, staged
+
+
 # ---------------------------
 # 3) Load
 # ---------------------------
 def run_load(staged_csv: Optional[str]):
     print("\n=== STEP 3: LOAD ===")
     if staged_csv is None:
-        raise RuntimeError("No staged CSV provided to load step.")
+        raise RuntimeError("No staged file provided to load step.")
 
     mod = try_import("load")
     if mod:
@@ -177,8 +309,7 @@ def run_load(staged_csv: Optional[str]):
                     create_fn()
                 except Exception as e:
                     print(f"⚠️ create_table_if_not_exists raised: {e}")
-            load_fn = getattr(mod, "load_to_supabase", None)
-            if callable(load_fn):
+            for _, load_fn in _resolve("load"):
                 print(f"Calling load.load_to_supabase('{staged_csv}') ...")
                 # try signatures with/without args
                 try:
@@ -194,15 +325,12 @@ def run_load(staged_csv: Optional[str]):
     script = ROOT / "load.py"
     if script.exists():
         # attempt to pass staged_csv as env var so script can read it if coded to do so
-        env = dict(os.environ)
-        env["STAGED_CSV"] = str(staged_csv)
-        print(f"🧪 Running fallback loader script: python {script}")
-        completed = subprocess.run([sys.executable, str(script)], cwd=str(ROOT), env=env)
-        if completed.returncode == 0:
+        code = run_script(script, env={"STAGED_CSV": str(staged_csv)})
+        if code == 0:
             print("✅ load.py completed (fallback).")
             return True
         else:
-            raise RuntimeError(f"load.py exited with code {completed.returncode}")
+            raise RuntimeError(f"load.py exited with code {code}")
     raise RuntimeError("No load method found and load.py missing or failed.")
 
 
@@ -211,19 +339,16 @@ def run_load(staged_csv: Optional[str]):
 # ---------------------------
 def run_analysis():
     print("\n=== STEP 4: ANALYSIS ===")
-    mod = try_import("etl_analysis")
-    if mod:
-        fn = getattr(mod, "main", None) or getattr(mod, "run_analysis", None) or getattr(mod, "run", None)
-        if callable(fn):
-            print("Calling etl_analysis.main() ...")
-            try:
-                return fn()
-            except Exception as e:
-                print(f"⚠️ etl_analysis.main() raised: {e}")
+    for fn_name, fn in _resolve("etl_analysis")[:1]:
+        print(f"Calling etl_analysis.{fn_name}() ...")
+        try:
+            return fn()
+        except Exception as e:
+            print(f"⚠️ etl_analysis.{fn_name}() raised: {e}")
     # fallback: run script
     script = ROOT / "etl_analysis.py"
     if script.exists():
-        code = run_subprocess(script)
+        code = run_script(script)
         if code == 0:
             print("✅ etl_analysis.py completed (fallback).")
             return True
@@ -237,22 +362,25 @@ def run_analysis():
 def run_full_pipeline():
     start = time.time()
     try:
-        extract_results = run_extract()
+        overlapped = run_extract_transform()
     except Exception as e:
-        print(f"\n❌ Extract step failed: {e}")
+        print(f"\n❌ Extract + transform step failed: {e}")
         return
 
-    # small pause
-    time.sleep(1)
-
-    try:
-        staged_csv = run_transform(extract_results)
-    except Exception as e:
-        print(f"\n❌ Transform step failed: {e}")
-        return
+    if overlapped is not None:
+        _, staged_csv = overlapped
+    else:
+        try:
+            extract_results = run_extract()
+        except Exception as e:
+            print(f"\n❌ Extract step failed: {e}")
+            return
 
-    # small pause
-    time.sleep(1)
+        try:
+            staged_csv = run_transform(extract_results)
+        except Exception as e:
+            print(f"\n❌ Transform step failed: {e}")
+            return
 
     try:
         run_load(staged_csv)
@@ -260,9 +388,6 @@ def run_full_pipeline():
         print(f"\n❌ Load step failed: {e}")
         return
 
-    # small pause
-    time.sleep(1)
-
     try:
         run_analysis()
     except Exception as e:
@@ -2,18 +2,22 @@
 transform.py
 
 Transforms raw air-quality JSON files (OpenAQ v3 or Open-Meteo fallback)
-into a clean tabular CSV with engineered features.
+into a clean tabular Parquet file with engineered features.
 
 Input:
     data/raw/*.json
 
 Output:
-    data/staged/air_quality_transformed.csv
+    data/staged/air_quality_transformed.parquet
 """
 
+import mmap
 import os
-import json
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import orjson
 import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype
 from pathlib import Path
 from datetime import datetime
 
@@ -21,18 +25,67 @@ RAW_DIR = Path("data/raw/")
 STAGED_DIR = Path("data/staged/")
 STAGED_DIR.mkdir(parents=True, exist_ok=True)
 
-OUTPUT_FILE = STAGED_DIR / "air_quality_transformed.csv"
+OUTPUT_FILE = STAGED_DIR / "air_quality_transformed.parquet"
+
+# Processes used to flatten raw files (1 = flatten in this process)
+FLATTEN_WORKERS = int(os.getenv("FLATTEN_WORKERS", str(os.cpu_count() or 1)))
+
+# Raw files at least this big are parsed straight from an mmap instead of a read() copy
+_MMAP_MIN_BYTES = 1 << 20
+
+# pandas < 3 copies every block in concat unless told not to; 3.x is copy-on-write and deprecates the flag
+_CONCAT_KW = {"copy": False} if int(pd.__version__.split(".")[0]) < 3 else {}
+
+# Right-closed bins: pm2_5 <= 50 Good, <= 100 Moderate, ...
+_AQI_BINS = np.array([-np.inf, 50, 100, 200, 300, np.inf])
+_AQI_LABELS = ["Good", "Moderate", "Unhealthy", "Very Unhealthy", "Hazardous"]
+
+# severity <= 200 Low, <= 400 Moderate, > 400 High
+_RISK_BINS = np.array([-np.inf, 200, 400, np.inf])
+_RISK_LABELS = ["Low Risk", "Moderate Risk", "High Risk"]
+
+# severity_score = pollutants @ weights
+_SEVERITY_COLS = ["pm2_5", "pm10", "nitrogen_dioxide", "sulphur_dioxide", "carbon_monoxide", "ozone"]
+_SEVERITY_WEIGHTS = np.array([5, 3, 4, 4, 2, 3], dtype=np.float32)
 
 
 # ---------------------------------------------------
 # Helper Functions
 # ---------------------------------------------------
 
-def load_json_files():
-    """Load all JSON files from data/raw directory."""
-    files = list(RAW_DIR.glob("*.json"))
-    print(f"📁 Found {len(files)} raw files.")
-    return files
+def iter_json_files():
+    """Yield paths of the JSON files in data/raw lazily, as the directory is scanned."""
+    if not RAW_DIR.is_dir():
+        return
+    with os.scandir(RAW_DIR) as it:
+        yield from (e.path for e in it if e.name.endswith(".json") and e.is_file())
+
+
+def _read_payload(file):
+    """Parse one raw JSON file from bytes (no text decode); large files via mmap."""
+    with open(file, "rb") as f:
+        if os.fstat(f.fileno()).st_size < _MMAP_MIN_BYTES:
+            return orjson.loads(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # every supported payload is a JSON object: bail out on anything else before parsing it all
+            if mm[:64].lstrip()[:1] != b"{":
+                return None
+            with memoryview(mm) as view:
+                return orjson.loads(view)
+
+
+def _load_one(file):
+    """Read + parse one raw file → (city, payload), or None if unreadable."""
+    try:
+        payload = _read_payload(file)
+    except (OSError, orjson.JSONDecodeError) as e:
+        print(f"⚠️ Skipping {file.name}: {e}")
+        return None
+    if payload is None:
+        print(f"⚠️ Skipping {file.name}: not a JSON object")
+        return None
+    # Infer city from filename
+    return file.stem.partition("_")[0], payload
 
 
 def flatten_openaq(payload, city):
@@ -44,29 +97,30 @@ def flatten_openaq(payload, city):
     if "results" not in payload:
         return pd.DataFrame()
 
-    rows = []
+    # column-oriented accumulation: one list per field, one DataFrame build
+    times, params, values = [], [], []
 
     for station in payload["results"]:
         if "measurements" not in station:
             continue
 
         for m in station["measurements"]:
-            rows.append({
-                "city": city,
-                "time": m.get("lastUpdated") or m.get("date", {}).get("utc"),
-                m.get("parameter"): m.get("value")
-            })
+            times.append(m.get("lastUpdated") or m.get("date", {}).get("utc"))
+            params.append(m.get("parameter"))
+            values.append(m.get("value"))
 
-    df = pd.DataFrame(rows)
+    if not times:
+        return pd.DataFrame()
 
-    if df.empty:
-        return df
+    times = pd.to_datetime(times, format="ISO8601", errors="coerce", utc=True, cache=True)
+    df = pd.DataFrame({"city": city, "time": times, "parameter": params, "value": values})
 
-    # Pivot to wide format: one row per timestamp
-    df = df.pivot_table(
-        index=["city", "time"],
-        aggfunc="first"
-    ).reset_index()
+    # Wide format: one row per timestamp (first non-null value per parameter)
+    df = (df.groupby(["city", "time", "parameter"])["value"]
+            .first()
+            .unstack("parameter")
+            .rename_axis(columns=None)
+            .reset_index())
 
     return df
 
@@ -85,9 +139,9 @@ def flatten_open_meteo(payload, city):
     df = pd.DataFrame(data)
     df["city"] = city
 
-    # Convert time column
+    # Convert time column (ISO8601 in GMT, e.g. "2024-01-15T13:00") with the vectorized parser
     if "time" in df.columns:
-        df["time"] = pd.to_datetime(df["time"], errors="coerce")
+        df["time"] = pd.to_datetime(df["time"], format="ISO8601", errors="coerce", utc=True, cache=True)
 
     return df
 
@@ -96,13 +150,34 @@ def detect_api_format(payload):
     """
     Determines if JSON is OpenAQ v3 or Open-Meteo.
     """
-    if "results" in payload:
+    if not isinstance(payload, dict):
+        return "unknown"
+    keys = payload.keys() & {"results", "hourly"}
+    if "results" in keys:
         return "openaq"
-    if "hourly" in payload:
+    if "hourly" in keys:
         return "openmeteo"
     return "unknown"
 
 
+def flatten_file(path):
+    """Read, detect and flatten one raw file → DataFrame (empty if unreadable or unknown)."""
+    file = Path(path)
+    item = _load_one(file)
+    if item is None:
+        return pd.DataFrame()
+    city, payload = item
+
+    fmt = detect_api_format(payload)
+
+    if fmt == "openaq":
+        return flatten_openaq(payload, city)
+    if fmt == "openmeteo":
+        return flatten_open_meteo(payload, city)
+    print(f"⚠️ Unknown format for {file.name}, skipping.")
+    return pd.DataFrame()
+
+
 # ---------------------------------------------------
 # Feature Engineering
 # ---------------------------------------------------
@@ -123,105 +198,87 @@ def add_features(df):
         else:
             df[col] = None
 
-    # Drop rows where all pollutants are missing
-    df = df.dropna(subset=pollutants, how="all")
+    # Drop rows where all pollutants are missing; the float32 block doubles as the severity input
+    X = df[_SEVERITY_COLS].to_numpy(dtype=np.float32, na_value=np.nan)
+    keep = ~np.isnan(X).all(axis=1)
+    df = df[keep].reset_index(drop=True)
+    X = X[keep]
 
     # -------------------------
     # 1) AQI Category (PM2.5)
     # -------------------------
-    def classify_aqi(pm2_5):
-        if pd.isna(pm2_5):
-            return "Unknown"
-        if pm2_5 <= 50:
-            return "Good"
-        elif pm2_5 <= 100:
-            return "Moderate"
-        elif pm2_5 <= 200:
-            return "Unhealthy"
-        elif pm2_5 <= 300:
-            return "Very Unhealthy"
-        else:
-            return "Hazardous"
-
-    df["AQI_Category"] = df["pm2_5"].apply(classify_aqi)
+    df["AQI_Category"] = (pd.cut(df["pm2_5"], _AQI_BINS, labels=_AQI_LABELS)
+                          .cat.add_categories("Unknown").fillna("Unknown"))
 
     # ----------------------------------
     # 2) Pollution Severity Score
     # ----------------------------------
-    df["severity_score"] = (
-        (df["pm2_5"] * 5) +
-        (df["pm10"] * 3) +
-        (df["nitrogen_dioxide"] * 4) +
-        (df["sulphur_dioxide"] * 4) +
-        (df["carbon_monoxide"] * 2) +
-        (df["ozone"] * 3)
-    )
+    # one float32 dot product instead of six Series temporaries (NaN propagates as before)
+    df["severity_score"] = X @ _SEVERITY_WEIGHTS
 
     # ----------------------------------
     # 3) Risk Classification
     # ----------------------------------
-    def classify_risk(s):
-        if pd.isna(s):
-            return "Unknown"
-        if s > 400:
-            return "High Risk"
-        elif s > 200:
-            return "Moderate Risk"
-        else:
-            return "Low Risk"
-
-    df["Risk_Level"] = df["severity_score"].apply(classify_risk)
+    df["Risk_Level"] = (pd.cut(df["severity_score"], _RISK_BINS, labels=_RISK_LABELS)
+                        .cat.add_categories("Unknown").fillna("Unknown"))
 
     # ----------------------------------
     # 4) Hour Feature
     # ----------------------------------
-    df["time"] = pd.to_datetime(df["time"], errors="coerce")
-    df["hour"] = df["time"].dt.hour
+    # both flatteners already return parsed times; only parse what arrives as text
+    if not is_datetime64_any_dtype(df["time"]):
+        df["time"] = pd.to_datetime(df["time"], format="ISO8601", errors="coerce", utc=True, cache=True)
+    df["hour"] = df["time"].dt.hour.astype("Int8")
 
     return df
 
 
+def _shrink_dtypes(df):
+    """Narrow dtypes before staging: float32 measures, categorical labels (hour is already Int8)."""
+    measures = [c for c in _SEVERITY_COLS + ["severity_score"] if c in df.columns]
+    df[measures] = df[measures].astype("float32")
+    for col in ["city", "AQI_Category", "Risk_Level"]:
+        df[col] = df[col].astype("category")
+    return df
+
+
 # ---------------------------------------------------
 # Main Transform Function
 # ---------------------------------------------------
 
-def transform():
-    files = load_json_files()
-    all_data = []
-
-    for file in files:
-        try:
-            payload = json.loads(file.read_text())
-        except:
-            continue
-
-        # Infer city from filename
-        city = file.stem.split("_")[0]
-
-        fmt = detect_api_format(payload)
-
-        if fmt == "openaq":
-            df = flatten_openaq(payload, city)
-        elif fmt == "openmeteo":
-            df = flatten_open_meteo(payload, city)
-        else:
-            print(f"⚠️ Unknown format for {file.name}, skipping.")
-            continue
-
-        if not df.empty:
-            all_data.append(df)
+def stage_frames(frames):
+    """Concat flattened frames, add features and write the staged file; returns its path."""
+    all_data = [df for df in frames if not df.empty]
 
     if not all_data:
         print("❌ No valid raw data found!")
-        return
+        return None
 
-    final_df = pd.concat(all_data, ignore_index=True)
+    # Same column order in every part lets concat stitch each column's blocks directly
+    canonical_cols = list(dict.fromkeys(c for d in all_data for c in d.columns))
+    all_data = [d if list(d.columns) == canonical_cols else d.reindex(columns=canonical_cols)
+                for d in all_data]
+    final_df = pd.concat(all_data, ignore_index=True, **_CONCAT_KW)
 
     # Apply cleaning + feature engineering
-    final_df = add_features(final_df)
+    final_df = _shrink_dtypes(add_features(final_df))
 
-    final_df.to_csv(OUTPUT_FILE, index=False)
+    # Columnar + zstd: typed, smaller, and read back by load.py without parsing
+    final_df.to_parquet(OUTPUT_FILE, engine="pyarrow", compression="zstd", index=False)
     print(f"✅ Saved transformed dataset → {OUTPUT_FILE}")
+    return str(OUTPUT_FILE.resolve())
+
+
+def transform():
+    # Read + parse + flatten is CPU-bound pandas work: one process per core, concat here.
+    # Workers pick up files while the directory scan is still feeding the pool.
+    if FLATTEN_WORKERS > 1:
+        with ProcessPoolExecutor(max_workers=FLATTEN_WORKERS) as ex:
+            frames = list(ex.map(flatten_file, iter_json_files()))
+    else:
+        frames = [flatten_file(path) for path in iter_json_files()]
+    print(f"📁 Found {len(frames)} raw files.")
+    return stage_frames(frames)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,10 @@
+import os
+import sys
+from pathlib import Path
+
+# The pipeline steps are plain scripts: import them from scripts/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+# load.py / etl_analysis.py read these at import time; nothing here talks to Supabase
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
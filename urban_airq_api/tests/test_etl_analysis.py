@@ -0,0 +1,134 @@
+import etl_analysis
+
+
+class _Resp:
+    def __init__(self, data=None, count=None):
+        self.data = data if data is not None else []
+        self.count = count
+        self.error = None
+
+
+class _Query:
+    def __init__(self, rows, count):
+        self.rows, self.count, self.head, self.span = rows, count, False, None
+
+    def select(self, *args, head=False, **kwargs):
+        self.head = head
+        return self
+
+    def order(self, *args, **kwargs):
+        return self
+
+    def range(self, start, end):
+        self.span = (start, end)
+        return self
+
+    def execute(self):
+        if self.head:
+            return _Resp(count=self.count)
+        start, end = self.span
+        return _Resp(self.rows[start:end + 1])
+
+
+class _Client:
+    def __init__(self, rows, count):
+        self.rows, self.count = rows, count
+
+    def table(self, name):
+        return _Query(self.rows, self.count)
+
+
+def _rows(n):
+    return [{"id": i, "city": "delhi", "time": "2024-01-15T13:00:00", "pm2_5": float(i)} for i in range(n)]
+
+
+def test_fetch_data_pages_until_short_page_when_count_missing(monkeypatch):
+    monkeypatch.setattr(etl_analysis, "PAGE_SIZE", 10)
+    monkeypatch.setattr(etl_analysis, "get_supabase_client", lambda: _Client(_rows(25), None))
+    df = etl_analysis.fetch_data()
+    assert len(df) == 25
+    assert df["pm2_5"].tolist() == [float(i) for i in range(25)]
+
+
+def test_fetch_data_uses_count_when_present(monkeypatch):
+    monkeypatch.setattr(etl_analysis, "PAGE_SIZE", 10)
+    monkeypatch.setattr(etl_analysis, "get_supabase_client", lambda: _Client(_rows(20), 20))
+    assert len(etl_analysis.fetch_data()) == 20
+
+
+def test_prepare_df_parses_iso8601_time_shapes(capsys):
+    import pandas as pd
+
+    times = [
+        "2024-01-15T13:00:00",
+        "2024-01-15T13:00:00.25",      # fractional seconds
+        "2024-01-15T13:00:00+00:00",   # timestamptz from PostgREST
+        "2024-01-15T13:00:00Z",
+        "2024-01-15 13:00:00",         # space separator
+        "2024-01-15T18:30:00+05:30",   # non-UTC offset
+        "not a time",
+    ]
+    df = pd.DataFrame({"city": "delhi", "time": times, "pm2_5": 1.0})
+    out = etl_analysis.prepare_df(df)
+
+    parsed = out["time"].dropna()
+    assert len(parsed) == 6
+    assert (parsed == pd.Timestamp("2024-01-15 13:00:00")).all()
+    assert out["hour"].dropna().eq(13).all()
+    assert "1 time values could not be parsed" in capsys.readouterr().out
+
+
+def test_dense_severity_plot_renders_and_frees_shared_axes(tmp_path):
+    import matplotlib.pyplot as plt
+    import numpy as np
+    import pandas as pd
+    from PIL import Image
+
+    n = etl_analysis.DENSITY_THRESHOLD + 5_000
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"pm2_5": rng.uniform(0, 300, n), "severity_score": rng.uniform(0, 900, n)})
+
+    fig, ax = plt.subplots(figsize=etl_analysis.FIGSIZE, dpi=etl_analysis.PLOT_DPI)
+    try:
+        # twice on the same axes: the colorbar must be gone before the next plot
+        for name in ("first.png", "second.png"):
+            etl_analysis.plot_severity_vs_pm25(df, ax, tmp_path / name)
+            assert fig.axes == [ax]
+    finally:
+        plt.close(fig)
+
+    assert Image.open(tmp_path / "second.png").size == (1000, 600)
+
+
+def test_prepare_df_coerces_mixed_type_columns():
+    import numpy as np
+    import pandas as pd
+
+    # PostgREST can hand back text and numbers side by side in one column
+    df = pd.DataFrame({
+        "city": ["delhi", "delhi", 7],
+        "time": ["2024-01-15T13:00:00"] * 3,
+        "pm2_5": pd.Series(["12.5", 7, "n/a"], dtype=object),
+        "hour": pd.Series([13, "13", None], dtype=object),
+    })
+    out = etl_analysis.prepare_df(df)
+
+    by_city = out.set_index(out["city"].astype(str))
+    assert out["pm2_5"].dtype == np.float32
+    assert by_city.loc["delhi", "pm2_5"].tolist() == [12.5, 7.0]
+    assert np.isnan(by_city.loc["7", "pm2_5"])  # "n/a" -> NaN, like pd.to_numeric(errors="coerce")
+    assert out["hour"].tolist() == [13, 13, 13]
+
+
+def test_write_csv_matches_to_csv_format(tmp_path):
+    import pandas as pd
+
+    df = pd.DataFrame({"city": ["bengaluru", "delhi, ncr"], "risk": ["High Risk", "Low"],
+                       "count": [218, 3], "pct": [100.0, float("nan")]})
+    etl_analysis._write_csv(df.iloc[:1], tmp_path / "one.csv")
+    assert (tmp_path / "one.csv").read_text().splitlines() == ["city,risk,count,pct", "bengaluru,High Risk,218,100.0"]
+
+    # a value with the delimiter still gets to_csv's minimal quoting
+    etl_analysis._write_csv(df, tmp_path / "quoted.csv")
+    df.to_csv(tmp_path / "expected.csv", index=False)
+    assert (tmp_path / "quoted.csv").read_bytes() == (tmp_path / "expected.csv").read_bytes()
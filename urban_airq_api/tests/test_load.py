@@ -0,0 +1,28 @@
+import datetime as dt
+
+import pandas as pd
+import pyarrow as pa
+
+import load
+
+
+def test_read_staged_keeps_fractional_second_times(tmp_path):
+    # transform stages tz-aware UTC times; OpenAQ lastUpdated carries milliseconds
+    staged = pd.DataFrame({
+        "time": pd.to_datetime(["2024-01-15T13:00:00Z", "2024-01-15T13:00:00.123Z"], format="ISO8601", utc=True),
+        "city": ["delhi", "delhi"],
+        "pm2_5": pd.Series([53.3, 12.5], dtype="float32"),
+        "Risk_Level": ["High Risk", "Low Risk"],
+        "hour": pd.Series([13, 13], dtype="Int8"),
+    })
+    path = tmp_path / "air_quality_transformed.parquet"
+    staged.to_parquet(path, index=False)
+
+    tbl = load._read_staged(str(path))
+
+    assert tbl.schema == load.STAGED_SCHEMA
+    assert tbl["time"].type == pa.timestamp("us")
+    assert tbl["time"].to_pylist() == [dt.datetime(2024, 1, 15, 13, 0),
+                                       dt.datetime(2024, 1, 15, 13, 0, 0, 123000)]
+    assert tbl["pm2_5"].to_pylist() == [53.3, 12.5]
+    assert tbl["risk_flag"].to_pylist() == ["High Risk", "Low Risk"]
@@ -0,0 +1,72 @@
+import types
+
+import pandas as pd
+
+import run_pipeline
+
+
+def _flatten(path):
+    # module-level so the process pool can pickle it
+    return pd.DataFrame({"city": [path], "pm2_5": [1.0]})
+
+
+def _transform_mod(staged):
+    # no FLATTEN_WORKERS attribute on purpose
+    return types.SimpleNamespace(
+        iter_json_files=lambda: iter(["old.json"]),
+        flatten_file=_flatten,
+        stage_frames=lambda frames: staged(frames),
+    )
+
+
+def _extract_mod(fetch_all_async):
+    return types.SimpleNamespace(fetch_all_async=fetch_all_async)
+
+
+def _use_modules(monkeypatch, extract_mod, transform_mod):
+    mods = {"extract": extract_mod, "transform": transform_mod}
+    monkeypatch.setattr(run_pipeline, "try_import", mods.get)
+
+
+def test_overlapped_extract_transform_stages_old_and_new_files(monkeypatch):
+    async def fetch_all_async(queue):
+        result = {"city": "Delhi", "raw_path": "new.json"}
+        await queue.put(result)
+        return [result]
+
+    staged_frames = []
+    transform_mod = _transform_mod(lambda frames: staged_frames.extend(frames) or "/staged.parquet")
+    _use_modules(monkeypatch, _extract_mod(fetch_all_async), transform_mod)
+
+    results, staged = run_pipeline.run_extract_transform()
+
+    assert staged == "/staged.parquet"
+    assert results == [{"city": "Delhi", "raw_path": "new.json"}]
+    assert sorted(f["city"][0] for f in staged_frames) == ["new.json", "old.json"]
+
+
+def test_overlapped_failure_returns_none(monkeypatch):
+    async def fetch_all_async(queue):
+        await queue.put({"city": "Delhi", "raw_path": "new.json"})
+        raise RuntimeError("network down")
+
+    transform_mod = _transform_mod(lambda frames: "/staged.parquet")
+    _use_modules(monkeypatch, _extract_mod(fetch_all_async), transform_mod)
+
+    assert run_pipeline.run_extract_transform() is None
+
+
+def test_full_pipeline_falls_back_to_sequential_steps(monkeypatch):
+    async def fetch_all_async(queue):
+        raise RuntimeError("network down")
+
+    _use_modules(monkeypatch, _extract_mod(fetch_all_async), _transform_mod(lambda frames: None))
+    calls = []
+    monkeypatch.setattr(run_pipeline, "run_extract", lambda: calls.append("extract") or [])
+    monkeypatch.setattr(run_pipeline, "run_transform", lambda res: calls.append("transform") or "/s.parquet")
+    monkeypatch.setattr(run_pipeline, "run_load", lambda staged: calls.append(("load", staged)))
+    monkeypatch.setattr(run_pipeline, "run_analysis", lambda: calls.append("analysis"))
+
+    run_pipeline.run_full_pipeline()
+
+    assert calls == ["extract", "transform", ("load", "/s.parquet"), "analysis"]